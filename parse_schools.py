@@ -265,6 +265,12 @@ def get_syllabus(board):
     }
     return syllabi.get(board, board)
 
+def grade_range(grades):
+    """Bitmask, lowest and highest grade of a comma-separated grades string"""
+    numbers = [int(g) for g in grades.split(',') if g.strip().isdigit()]
+    mask = sum(1 << g for g in set(numbers))
+    return mask, min(numbers, default=None), max(numbers, default=None)
+
 def convert_to_fixture(schools):
     """Convert parsed schools to Django fixture format"""
     fixture = []
@@ -279,6 +285,7 @@ def convert_to_fixture(schools):
             grades = "6,7,8,9,10,11,12"
         else:
             grades = "1,2,3,4,5,6,7,8,9,10,11,12"
+        grades_mask, min_grade, max_grade = grade_range(grades)
         
         entry = {
             "model": "schools.school",
@@ -289,6 +296,9 @@ def convert_to_fixture(schools):
                 "pin_code": school['pin_code'],
                 "board": school['board'],
                 "grades_offered": grades,
+                "grades_mask": grades_mask,
+                "min_grade": min_grade,
+                "max_grade": max_grade,
                 "co_ed_type": infer_co_ed_type(school['name']),
                 "distance": generate_distance(),
                 "bus_availability": random.random() > 0.3,  # 70% have bus
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class SchoolsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'schools'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from . import signals
+
+        post_migrate.connect(signals.restore_sqlite_fts_triggers, sender=self)
@@ -0,0 +1,300 @@
+"""In-memory bitmap index over the categorical School filters"""
+import heapq
+import threading
+from collections import defaultdict
+
+from .caching import get_dataset_version
+from .models import School, grades_in_mask
+
+
+def rating_bucket(rating):
+    """Map a rating to its star bucket (e.g. 3.7 -> 3, matching [3, 4))"""
+    try:
+        return int(float(rating))
+    except (TypeError, ValueError):
+        return 0
+
+
+def bits_from_positions(positions):
+    """Build a bitset from bit positions in one pass (avoids O(n^2) big-int ORs)"""
+    positions = list(positions)
+    if not positions:
+        return 0
+    buffer = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+class SchoolBitmapIndex:
+    """
+    Per-process bitmap index over School.
+
+    Every school gets a bit position, and every (facet, value) pair gets a
+    Python int used as a bitset: one per board, co-ed type, bus flag, rating
+    bucket, grade and facility. A filter combination is resolved with a few
+    integer AND/OR operations instead of SQL predicates.
+
+    The index also keeps the sort keys needed to order a result set, so the
+    caller only has to fetch the rows it actually displays.
+
+    The index is built lazily on first use, patched by the signal handlers in
+    schools.signals and can be dropped with invalidate() after bulk writes.
+    It is rebuilt whenever the dataset version (schools.caching) moves on
+    without this process having patched the change, e.g. after an import.
+    """
+
+    FACETS = ('board', 'co_ed_type', 'bus', 'rating', 'grade', 'facility')
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._dataset_version = None
+        self._reset()
+
+    def _reset(self):
+        self._ids = []            # bit position -> school id
+        self._positions = {}      # school id -> bit position
+        self._keys = {}           # bit position -> {facet: [values]}
+        self._sort_rating = {}    # bit position -> (-rating, name)
+        self._fees = {}           # bit position -> default fee
+        self._bitmaps = {facet: defaultdict(int) for facet in self.FACETS}
+        self._all = 0
+
+    # Building and patching
+
+    def build(self):
+        """(Re)build the whole index from the School table"""
+        with self._lock:
+            self._reset()
+            self._dataset_version = get_dataset_version()
+            facility_map = defaultdict(list)
+            through = School.facilities.through
+            for school_id, facility_id in through.objects.values_list('school_id', 'facility_id'):
+                facility_map[school_id].append(facility_id)
+
+            schools = School.objects.only(
+                'id', 'name', 'board', 'co_ed_type', 'bus_availability',
+                'rating', 'grades_mask', 'default_fee',
+            ).order_by('pk')
+            members = defaultdict(list)
+            for school in schools.iterator(chunk_size=2000):
+                position = self._store(school, facility_map.get(school.pk, []))
+                for facet, values in self._keys[position].items():
+                    for value in values:
+                        members[facet, value].append(position)
+
+            for (facet, value), positions in members.items():
+                self._bitmaps[facet][value] = bits_from_positions(positions)
+            self._all = bits_from_positions(self._keys)
+            self._built = True
+
+    def ensure_built(self):
+        """Build the index if it is missing or older than the dataset version"""
+        if not self._built or self._dataset_version != get_dataset_version():
+            self.build()
+
+    def follow_version(self, previous, current):
+        """
+        Adopt a new dataset version after this process patched the change
+        in itself; an index that was already behind still gets rebuilt.
+        """
+        with self._lock:
+            if self._dataset_version == previous:
+                self._dataset_version = current
+
+    def invalidate(self):
+        """Drop the index; it is rebuilt on next use"""
+        with self._lock:
+            self._built = False
+            self._reset()
+
+    def update(self, school, facility_ids=None):
+        """Insert or refresh a single school"""
+        with self._lock:
+            if not self._built:
+                return
+            if facility_ids is None:
+                facility_ids = list(school.facilities.values_list('id', flat=True))
+            self._remove(school.pk)
+            self._add(school, facility_ids)
+
+    def remove(self, school_id):
+        """Remove a single school"""
+        with self._lock:
+            if self._built:
+                self._remove(school_id)
+
+    def _store(self, school, facility_ids):
+        """Record a school's facet values and sort keys; returns its bit position"""
+        position = self._positions.get(school.pk)
+        if position is None:
+            position = len(self._ids)
+            self._ids.append(school.pk)
+            self._positions[school.pk] = position
+
+        self._keys[position] = {
+            'board': [school.board],
+            'co_ed_type': [school.co_ed_type],
+            'bus': [bool(school.bus_availability)],
+            'rating': [rating_bucket(school.rating)],
+            'grade': grades_in_mask(school.grades_mask),
+            'facility': list(facility_ids),
+        }
+        self._sort_rating[position] = (-float(school.rating or 0), school.name)
+        self._fees[position] = school.default_fee
+        return position
+
+    def _add(self, school, facility_ids):
+        position = self._store(school, facility_ids)
+        bit = 1 << position
+        for facet, values in self._keys[position].items():
+            for value in values:
+                self._bitmaps[facet][value] |= bit
+        self._all |= bit
+
+    def _remove(self, school_id):
+        position = self._positions.get(school_id)
+        if position is None:
+            return
+        mask = ~(1 << position)
+        for facet, values in self._keys.pop(position, {}).items():
+            for value in values:
+                self._bitmaps[facet][value] &= mask
+        self._sort_rating.pop(position, None)
+        self._fees.pop(position, None)
+        self._all &= mask
+        # Keep the position reserved so re-inserts reuse the same bit
+
+    # Querying
+
+    def _union(self, facet, values):
+        bitmap = self._bitmaps[facet]
+        bits = 0
+        for value in values:
+            bits |= bitmap.get(value, 0)
+        return bits
+
+    def _selection_bits(self, selected):
+        """{facet: values} -> {facet: union bitset}, skipping unfiltered facets"""
+        return {
+            facet: self._union(facet, values)
+            for facet, values in selected.items() if values
+        }
+
+    def resolve(self, boards=None, co_ed_types=None, bus=None, ratings=None,
+                grade=None, facilities=None):
+        """
+        Resolve a filter combination to a bitset of matching schools.
+
+        Values inside one facet are OR'd together, facets are AND'd. Empty
+        arguments leave that facet unfiltered; bus is True, False or None and
+        grade is an int or None.
+        """
+        selected = {
+            'board': boards,
+            'co_ed_type': co_ed_types,
+            'bus': [bus] if bus is not None else None,
+            'rating': ratings,
+            'grade': [grade] if grade is not None else None,
+            'facility': facilities,
+        }
+        with self._lock:
+            self.ensure_built()
+            bits = self._all
+            for facet_bits in self._selection_bits(selected).values():
+                bits &= facet_bits
+            return bits
+
+    def facet_counts(self, selected, facets, base=None):
+        """
+        Per-value counts for each facet in facets: {facet: {value: count}}.
+
+        selected maps facet names to the active values ({'board': ['CBSE']}).
+        Each facet is counted against every filter except its own, so picking
+        CBSE still shows how many ICSE schools the other filters leave. base
+        is an optional bitset of schools already narrowed by non-facet
+        filters (name, fees, distance).
+        """
+        with self._lock:
+            self.ensure_built()
+            filters = self._selection_bits(selected)
+            base = self._all if base is None else base & self._all
+            counts = {}
+            for facet in facets:
+                bits = base
+                for other, facet_bits in filters.items():
+                    if other != facet:
+                        bits &= facet_bits
+                counts[facet] = {
+                    value: self.count(bits & value_bits)
+                    for value, value_bits in self._bitmaps[facet].items()
+                }
+            return counts
+
+    def bits_for_ids(self, ids):
+        """Convert an iterable of school IDs into a bitset"""
+        with self._lock:
+            self.ensure_built()
+            positions = self._positions
+            bits = bits_from_positions(
+                positions[school_id] for school_id in ids if school_id in positions
+            )
+            return bits & self._all
+
+    def _positions_in(self, bits):
+        # Walk the binary representation once instead of peeling bits one by one
+        binary = bin(bits)[:1:-1]
+        return [i for i, flag in enumerate(binary) if flag == '1']
+
+    def to_ids(self, bits):
+        """Convert a bitset into a list of school IDs"""
+        with self._lock:
+            return [self._ids[position] for position in self._positions_in(bits)]
+
+    def count(self, bits):
+        """Number of schools in a bitset (a popcount, no sorting or DB work)"""
+        return bin(bits).count('1')
+
+    def sort_key(self, sort='rating', distances=None, relevance=None):
+        """
+        Build the key function for a display order, mapping a bit position to
+        a JSON-serialisable tuple that ends with the school ID (so keys are
+        unique and usable as keyset cursors).
+
+        sort is 'rating' (rating desc, then name), 'fees' (default fee asc,
+        schools without fees last), 'distance' (needs a distances dict keyed
+        by school ID) or 'relevance' (needs a dict of name-match scores).
+        """
+        ids = self._ids
+        rating = self._sort_rating
+        if sort == 'relevance':
+            return lambda p: (-relevance.get(ids[p], 0),) + rating[p] + (ids[p],)
+        if sort == 'distance':
+            return lambda p: (distances.get(ids[p], float('inf')),) + rating[p] + (ids[p],)
+        if sort == 'fees':
+            fees = self._fees
+            return lambda p: (float('inf') if fees[p] is None else fees[p],) + rating[p] + (ids[p],)
+        return lambda p: rating[p] + (ids[p],)
+
+    def page(self, bits, sort='rating', after=None, limit=20, distances=None, relevance=None):
+        """
+        Keyset page over the schools in bits: the first `limit` entries whose
+        sort key is greater than `after`, as [(key, school_id), ...]. A limit
+        of None returns every entry after `after`, fully sorted.
+
+        Only the requested page is selected (heap selection, not a full sort),
+        and because the cursor is a key rather than an offset, schools added
+        or removed between requests do not shift later pages.
+        """
+        with self._lock:
+            key = self.sort_key(sort, distances, relevance)
+            keys = (key(position) for position in self._positions_in(bits))
+            if after is not None:
+                after = tuple(after)
+                keys = (k for k in keys if k > after)
+            selected = sorted(keys) if limit is None else heapq.nsmallest(limit, keys)
+            return [(k, k[-1]) for k in selected]
+
+
+school_index = SchoolBitmapIndex()
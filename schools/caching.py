@@ -0,0 +1,106 @@
+"""
+Dataset versioning for cached school data.
+
+Every write to School or Facility (see schools.signals) and every bulk
+import bumps a single dataset version number, kept in the one-row
+DatasetVersion table so every worker process and management command sees
+the same number whatever the cache backend. Cache keys embed the version,
+so entries computed from older data are simply never looked up again and
+expire on their own; nothing has to be purged. The in-process indexes
+rebuild when the version moves on without them.
+
+Review writes don't bump it: nothing versioned reads reviews (the rating
+facet and sort use the listed School.rating), and the pages that do show
+them are keyed on School.updated_at or dropped per school instead.
+
+Each process rereads the version at most every DATASET_VERSION_TTL seconds,
+so writes from other processes show up after that delay.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import DatasetVersion
+
+
+# Primary key of the DatasetVersion row
+DATASET_VERSION_ID = 1
+
+# Seconds a process reuses the dataset version it last read
+DATASET_VERSION_TTL = 1.0
+
+# Ordered result IDs kept per search; deeper pages are computed live
+RESULT_CACHE_SIZE = 1000
+
+# How long (seconds) a cached search result list is kept
+RESULT_CACHE_TIMEOUT = 600
+
+# How long (seconds) a rendered school detail page is kept
+SCHOOL_PAGE_CACHE_TIMEOUT = 3600
+
+
+# (version, time.monotonic() when read) as last seen by this process
+_last_version = (None, 0.0)
+
+
+def _read_dataset_version():
+    """Current dataset version from the database, creating the row on first use"""
+    global _last_version
+    version = DatasetVersion.objects.filter(pk=DATASET_VERSION_ID).values_list('version', flat=True).first()
+    if version is None:
+        # Seed from the clock so a recreated row never reuses an old number
+        version = DatasetVersion.objects.get_or_create(
+            pk=DATASET_VERSION_ID, defaults={'version': int(time.time() * 1000)}
+        )[0].version
+    _last_version = (version, time.monotonic())
+    return version
+
+
+def get_dataset_version():
+    """Current dataset version, reread from the database every DATASET_VERSION_TTL seconds"""
+    version, read_at = _last_version
+    if version is None or time.monotonic() - read_at > DATASET_VERSION_TTL:
+        version = _read_dataset_version()
+    return version
+
+
+def bump_dataset_version():
+    """Advance the dataset version; returns (previous, current)"""
+    global _last_version
+    with transaction.atomic():
+        if not DatasetVersion.objects.filter(pk=DATASET_VERSION_ID).update(version=F('version') + 1):
+            # Row missing (never created, or the table was flushed)
+            _read_dataset_version()
+            DatasetVersion.objects.filter(pk=DATASET_VERSION_ID).update(version=F('version') + 1)
+        # The update holds the row's write lock, so no other bump lands in between
+        current = DatasetVersion.objects.values_list('version', flat=True).get(pk=DATASET_VERSION_ID)
+    _last_version = (current, time.monotonic())
+    return current - 1, current
+
+
+def school_page_key(school_id):
+    """
+    Cache key for a school's rendered detail page. Unlike search results it
+    isn't versioned: schools.signals deletes it when that school or its
+    reviews change.
+    """
+    return f'schools:page:{school_id}'
+
+
+def invalidate_school_pages(school_ids):
+    """Drop the cached detail pages of the given schools"""
+    cache.delete_many([school_page_key(school_id) for school_id in school_ids])
+
+
+def versioned_key(prefix, params):
+    """
+    Cache key for params (any JSON-serialisable value) under the current
+    dataset version.
+    """
+    payload = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    digest = hashlib.md5(payload.encode('utf-8')).hexdigest()
+    return f'{prefix}:{get_dataset_version()}:{digest}'
@@ -0,0 +1,291 @@
+"""Per-process coordinate arrays and grid index for distance, radius and nearest-school queries"""
+import math
+import threading
+from collections import defaultdict
+
+from .caching import get_dataset_version
+from .models import School
+from .utils import EARTH_RADIUS_KM, NUMPY_AVAILABLE, haversine_many
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+
+# Side of a grid cell in degrees (~11 km of latitude)
+CELL_DEGREES = 0.1
+
+
+def grid_cell(lat, lon):
+    """(row, column) of the grid cell holding a coordinate"""
+    return (math.floor(lat / CELL_DEGREES), math.floor(lon / CELL_DEGREES))
+
+
+class SchoolCoordinates:
+    """
+    School coordinates held as two float arrays aligned with a list of IDs.
+
+    distances() computes the distance from one origin to every school in a
+    single vectorized haversine pass (a plain loop without NumPy) instead of
+    one SQL expression or Python call per school. Removed schools keep their
+    slot with NaN coordinates, which never pass a distance filter.
+
+    Slots are also bucketed in a grid of CELL_DEGREES cells, so within() and
+    nearest() only compute distances for the schools in the cells around the
+    origin rather than for every school.
+
+    Built lazily, patched per school by the signal handlers in
+    schools.signals and rebuilt when the dataset version moves on without
+    this process having patched the change.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._dataset_version = None
+        self._reset()
+
+    def _reset(self):
+        self._ids = []            # slot -> school id
+        self._positions = {}      # school id -> slot
+        self._latitudes = self._array([])
+        self._longitudes = self._array([])
+        self._cells = defaultdict(list)     # grid cell -> slots
+        self._slot_cells = []               # slot -> grid cell, or None without coordinates
+
+    def _array(self, values):
+        return np.array(values, dtype=float) if NUMPY_AVAILABLE else list(values)
+
+    # Building and patching
+
+    def build(self):
+        """(Re)build the arrays from the School table"""
+        with self._lock:
+            self._reset()
+            self._dataset_version = get_dataset_version()
+            rows = list(
+                School.objects.filter(latitude__isnull=False, longitude__isnull=False)
+                .values_list('id', 'latitude', 'longitude').order_by('pk')
+            )
+            self._ids = [school_id for school_id, lat, lon in rows]
+            self._positions = {school_id: slot for slot, school_id in enumerate(self._ids)}
+            self._latitudes = self._array([lat for school_id, lat, lon in rows])
+            self._longitudes = self._array([lon for school_id, lat, lon in rows])
+            for slot, (school_id, lat, lon) in enumerate(rows):
+                cell = grid_cell(lat, lon)
+                self._cells[cell].append(slot)
+                self._slot_cells.append(cell)
+            self._built = True
+
+    def _move(self, slot, cell):
+        """Re-bucket a slot into cell (None takes it out of the grid)"""
+        previous = self._slot_cells[slot]
+        if previous == cell:
+            return
+        if previous is not None:
+            self._cells[previous].remove(slot)
+            if not self._cells[previous]:
+                del self._cells[previous]
+        if cell is not None:
+            self._cells[cell].append(slot)
+        self._slot_cells[slot] = cell
+
+    def is_current(self):
+        """Whether the arrays are built and up to date, so a query won't rebuild them"""
+        with self._lock:
+            return self._built and self._dataset_version == get_dataset_version()
+
+    def ensure_built(self):
+        """Build the arrays if they are missing or older than the dataset version"""
+        if not self._built or self._dataset_version != get_dataset_version():
+            self.build()
+
+    def follow_version(self, previous, current):
+        """Adopt a new dataset version after patching the change in place"""
+        with self._lock:
+            if self._dataset_version == previous:
+                self._dataset_version = current
+
+    def invalidate(self):
+        """Drop the arrays; they are rebuilt on next use"""
+        with self._lock:
+            self._built = False
+            self._reset()
+
+    def update(self, school):
+        """Insert or refresh a single school's coordinates"""
+        with self._lock:
+            if not self._built:
+                return
+            lat = school.latitude if school.latitude is not None else math.nan
+            lon = school.longitude if school.longitude is not None else math.nan
+            cell = grid_cell(lat, lon) if not (math.isnan(lat) or math.isnan(lon)) else None
+            slot = self._positions.get(school.pk)
+            if slot is not None:
+                self._latitudes[slot] = lat
+                self._longitudes[slot] = lon
+                self._move(slot, cell)
+                return
+            slot = len(self._ids)
+            self._positions[school.pk] = slot
+            self._ids.append(school.pk)
+            self._slot_cells.append(None)
+            self._move(slot, cell)
+            if NUMPY_AVAILABLE:
+                self._latitudes = np.append(self._latitudes, lat)
+                self._longitudes = np.append(self._longitudes, lon)
+            else:
+                self._latitudes.append(lat)
+                self._longitudes.append(lon)
+
+    def remove(self, school_id):
+        """Remove a single school (its slot is kept, with NaN coordinates)"""
+        with self._lock:
+            slot = self._positions.get(school_id) if self._built else None
+            if slot is not None:
+                self._latitudes[slot] = math.nan
+                self._longitudes[slot] = math.nan
+                self._move(slot, None)
+
+    # Querying
+
+    def distances(self, origin, max_distance=None):
+        """
+        Distances (km) from origin, a (lat, lon) tuple, to every school with
+        coordinates, as {school_id: km}; only schools within max_distance
+        when it is given.
+        """
+        with self._lock:
+            self.ensure_built()
+            ids = self._ids
+            distances = haversine_many(origin, self._latitudes, self._longitudes)
+
+        if NUMPY_AVAILABLE:
+            # NaN compares false, so removed schools drop out of both masks
+            mask = distances <= max_distance if max_distance is not None else ~np.isnan(distances)
+            slots = np.flatnonzero(mask)
+            return dict(zip([ids[slot] for slot in slots.tolist()], distances[slots].tolist()))
+
+        if max_distance is not None:
+            return {ids[slot]: d for slot, d in enumerate(distances) if d <= max_distance}
+        return {ids[slot]: d for slot, d in enumerate(distances) if not math.isnan(d)}
+
+    def _slot_distances(self, origin, slots):
+        """[(km, slot), ...] from origin to the given slots"""
+        if NUMPY_AVAILABLE:
+            index = np.fromiter(slots, dtype=np.intp, count=len(slots))
+            distances = haversine_many(origin, self._latitudes[index], self._longitudes[index]).tolist()
+        else:
+            distances = haversine_many(
+                origin, [self._latitudes[slot] for slot in slots], [self._longitudes[slot] for slot in slots]
+            )
+        return list(zip(distances, slots))
+
+    def _cells_in_box(self, rows, columns):
+        """Slots in the occupied cells within the inclusive (low, high) row and column ranges"""
+        (row_low, row_high), (column_low, column_high) = rows, columns
+        slots = []
+        for row in range(row_low, row_high + 1):
+            for column in range(column_low, column_high + 1):
+                slots.extend(self._cells.get((row, column), ()))
+        return slots
+
+    def _rings(self, center):
+        """
+        Yield (radius, slots) for the non-empty rings of cells `radius` cells
+        away (Chebyshev) from center, nearest first.
+
+        Ring perimeters are walked while they are smaller than the occupied
+        grid; past that, the remaining occupied cells are grouped by ring,
+        so sparse outskirts don't cost one step per empty ring.
+        """
+        row, column = center
+        radius = 0
+        while 8 * radius <= len(self._cells):
+            if radius == 0:
+                slots = list(self._cells.get(center, ()))
+            else:
+                slots = []
+                for offset in range(-radius, radius + 1):
+                    slots.extend(self._cells.get((row - radius, column + offset), ()))
+                    slots.extend(self._cells.get((row + radius, column + offset), ()))
+                for offset in range(-radius + 1, radius):
+                    slots.extend(self._cells.get((row + offset, column - radius), ()))
+                    slots.extend(self._cells.get((row + offset, column + radius), ()))
+            if slots:
+                yield radius, slots
+            radius += 1
+
+        rings = defaultdict(list)
+        for (cell_row, cell_column), cell_slots in self._cells.items():
+            ring = max(abs(cell_row - row), abs(cell_column - column))
+            if ring >= radius:
+                rings[ring].extend(cell_slots)
+        for ring in sorted(rings):
+            yield ring, rings[ring]
+
+    def within(self, origin, km):
+        """
+        Schools within km of origin, a (lat, lon) tuple, as {school_id: km}.
+
+        Only the grid cells overlapping the radius's bounding box are read.
+        A box spanning at least as many cells as the grid has occupied (the
+        default 50 km search radius over one city) would read most schools
+        anyway, so it gets the single vectorized pass of distances() instead.
+        """
+        lat, lon = origin
+        angle = km / EARTH_RADIUS_KM
+        lat_span = math.degrees(angle)
+        # Widest longitude offset of a point within the radius, at the origin's latitude
+        sin_lon = math.sin(angle) / max(math.cos(math.radians(lat)), 1e-12)
+        lon_span = math.degrees(math.asin(sin_lon)) if angle < math.pi / 2 and sin_lon < 1 else 180.0
+
+        with self._lock:
+            self.ensure_built()
+            low_row, low_column = grid_cell(lat - lat_span, lon - lon_span)
+            high_row, high_column = grid_cell(lat + lat_span, lon + lon_span)
+            if (high_row - low_row + 1) * (high_column - low_column + 1) >= len(self._cells):
+                return self.distances(origin, km)
+            slots = self._cells_in_box((low_row, high_row), (low_column, high_column))
+            found = self._slot_distances(origin, slots)
+            ids = self._ids
+        return {ids[slot]: d for d, slot in found if d <= km}
+
+    def nearest(self, origin, k, exclude=()):
+        """
+        The k schools closest to origin, a (lat, lon) tuple, as a list of
+        (school_id, km) sorted by distance. School IDs in exclude are skipped.
+
+        Grid rings around the origin's cell are read outwards until k schools
+        lie within the distance the rings read so far are sure to cover.
+        """
+        lat, lon = origin
+        center = grid_cell(lat, lon)
+        cos_lat = math.cos(math.radians(lat))
+        found = []
+
+        with self._lock:
+            self.ensure_built()
+            ids = self._ids
+            if k <= 0:
+                return []
+            for radius, slots in self._rings(center):
+                found.extend(
+                    (d, slot) for d, slot in self._slot_distances(origin, slots) if ids[slot] not in exclude
+                )
+                # Distance from origin to the nearest edge of the rings read so far
+                south = lat - (center[0] - radius) * CELL_DEGREES
+                north = (center[0] + radius + 1) * CELL_DEGREES - lat
+                west = lon - (center[1] - radius) * CELL_DEGREES
+                east = (center[1] + radius + 1) * CELL_DEGREES - lon
+                lon_edge = math.radians(min(west, east, 90.0))
+                covered = EARTH_RADIUS_KM * min(
+                    math.radians(min(south, north)),
+                    math.asin(min(cos_lat * math.sin(lon_edge), 1.0)),
+                )
+                if sum(1 for d, slot in found if d <= covered) >= k:
+                    break
+        found.sort()
+        return [(ids[slot], d) for d, slot in found[:k]]
+
+
+school_coordinates = SchoolCoordinates()
@@ -0,0 +1,74 @@
+"""Facet counts for school search, computed from the bitmap index and cached per filter set"""
+from django.core.cache import cache
+
+from .bitmap_index import school_index
+from .caching import versioned_key
+
+
+# Facets shown with counts, in display order
+FACETS = ('board', 'rating', 'bus', 'co_ed_type', 'grade', 'facility')
+
+# How long (seconds) a computed set of counts is reused
+FACET_CACHE_TIMEOUT = 300
+
+
+def selected_facets(filters):
+    """Map normalized search filters onto the bitmap index's facet names"""
+    return {
+        'board': filters['boards'],
+        'co_ed_type': filters['co_ed_types'],
+        'bus': [filters['bus']] if filters['bus'] is not None else [],
+        'rating': filters['ratings'],
+        'grade': [filters['grade']] if filters['grade'] is not None else [],
+        'facility': filters['facilities'],
+    }
+
+
+def facet_value_label(facet, value):
+    """JSON-friendly key for a facet value (bus flags use the 'yes'/'no' form values)"""
+    if facet == 'bus':
+        return 'yes' if value else 'no'
+    return str(value)
+
+
+def get_facet_counts(filters, narrow):
+    """
+    Counts for every facet value under the given filters.
+
+    Returns {'count': total matches, 'facets': {facet: {value: count}}}.
+    narrow is a callable returning the bitset left by the non-categorical
+    filters (or None); it only runs on a cache miss, since it may hit the
+    database. All counts come from one pass of popcounts over the index.
+    """
+    key = versioned_key('school_facets', filters)
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    base = narrow()
+    selected = selected_facets(filters)
+    counts = school_index.facet_counts(selected, FACETS, base)
+
+    matches = school_index.resolve(
+        boards=filters['boards'],
+        co_ed_types=filters['co_ed_types'],
+        bus=filters['bus'],
+        ratings=filters['ratings'],
+        grade=filters['grade'],
+        facilities=filters['facilities'],
+    )
+    if base is not None:
+        matches &= base
+
+    result = {
+        'count': school_index.count(matches),
+        'facets': {
+            facet: {
+                facet_value_label(facet, value): count
+                for value, count in sorted(counts[facet].items())
+            }
+            for facet in FACETS
+        },
+    }
+    cache.set(key, result, FACET_CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,39 @@
+"""Per-school template fragments cached under the school's pk and updated_at"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+
+# How long (seconds) a rendered fragment is kept; a changed school gets new keys anyway
+FRAGMENT_CACHE_TIMEOUT = 24 * 3600
+
+
+def fragment_key(template_name, school):
+    """
+    Cache key for one school's fragment. Every change to what a fragment
+    shows moves the school's updated_at (School saves, review counters and
+    schools.signals.touch_schools for facilities), so stale keys are never
+    looked up again.
+    """
+    stamp = int(school.updated_at.timestamp() * 1e6)
+    return f'schools:fragment:{template_name}:{school.pk}:{stamp}'
+
+
+def render_fragments(fragments):
+    """
+    Render (template_name, school) pairs, each with the school as `school`
+    in its context, and return their HTML in the same order.
+
+    Cached fragments are fetched in one get_many; only the misses are
+    rendered, and they are stored back in one set_many.
+    """
+    keys = [fragment_key(template_name, school) for template_name, school in fragments]
+    cached = cache.get_many(keys)
+    rendered = {}
+    for key, (template_name, school) in zip(keys, fragments):
+        if key not in cached and key not in rendered:
+            rendered[key] = render_to_string(template_name, {'school': school})
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_CACHE_TIMEOUT)
+    cached.update(rendered)
+    return [mark_safe(cached[key]) for key in keys]
@@ -0,0 +1,113 @@
+"""
+Pin-code centroid gazetteer: a sorted binary file searched through mmap.
+
+The file is built by `manage.py build_pincode_gazetteer` from a pin-code
+dataset CSV. It holds a small header followed by fixed-size records
+(pin code, latitude, longitude) sorted by pin code, so a lookup is a binary
+search over the mapped bytes. Every worker process maps the same file, and
+the OS shares its pages between them instead of each keeping its own dict.
+"""
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+
+
+MAGIC = b'PINGAZ1\0'
+HEADER = struct.Struct('<8sI')      # magic, record count
+RECORD = struct.Struct('<Iff')      # pin code, latitude, longitude
+
+
+def gazetteer_path():
+    return str(settings.PINCODE_GAZETTEER_PATH)
+
+
+def write_gazetteer(path, centroids):
+    """
+    Write {pin_code: (lat, lon)} as a gazetteer file.
+
+    The file is written next to path and renamed into place, so processes
+    reading the old file never see a partial one.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(centroids)))
+        for pin in sorted(centroids):
+            lat, lon = centroids[pin]
+            f.write(RECORD.pack(pin, lat, lon))
+    os.replace(tmp_path, path)
+
+
+class PincodeGazetteer:
+    """
+    Memory-mapped view of a gazetteer file.
+
+    The file is mapped on first lookup and remapped when it is replaced
+    (its modification time changes). If no file exists, available() is
+    False and lookups return None.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._lock = threading.Lock()
+        self._mapping = (None, None, 0)     # (mtime, mmap buffer, record count)
+
+    @property
+    def path(self):
+        return self._path or gazetteer_path()
+
+    def _current(self):
+        """(buffer, count) of the mapped file, remapping it if it was replaced; None when missing"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        mapped_mtime, buffer, count = self._mapping
+        if mtime != mapped_mtime:
+            with self._lock:
+                mapped_mtime, buffer, count = self._mapping
+                if mtime != mapped_mtime:
+                    with open(self.path, 'rb') as f:
+                        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    magic, count = HEADER.unpack_from(buffer, 0)
+                    if magic != MAGIC or len(buffer) != HEADER.size + count * RECORD.size:
+                        raise ValueError(f'{self.path} is not a pin-code gazetteer file')
+                    self._mapping = (mtime, buffer, count)
+        return buffer, count
+
+    def available(self):
+        return self._current() is not None
+
+    def __len__(self):
+        current = self._current()
+        return current[1] if current else 0
+
+    def lookup(self, pin_code):
+        """(lat, lon) centroid for a 6-digit pin code, or None if it isn't listed"""
+        current = self._current()
+        if current is None:
+            return None
+        try:
+            pin = int(pin_code)
+        except (TypeError, ValueError):
+            return None
+
+        buffer, count = current
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            found, lat, lon = RECORD.unpack_from(buffer, HEADER.size + middle * RECORD.size)
+            if found < pin:
+                low = middle + 1
+            elif found > pin:
+                high = middle
+            else:
+                # Stored as float32; six decimals is ~0.1 m
+                return (round(lat, 6), round(lon, 6))
+        return None
+
+
+pincode_gazetteer = PincodeGazetteer()
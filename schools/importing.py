@@ -0,0 +1,303 @@
+"""
+Row cleaning for import_schools_csv.
+
+Everything here is plain Python that imports nothing from Django (URL
+parsing comes from schools.maps_links for the same reason), so chunks of CSV
+records can be cleaned in worker processes that never set Django up.
+Patterns are compiled once at import time.
+"""
+import codecs
+import csv
+import multiprocessing
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .maps_links import parse_google_maps_url
+
+
+# Bytes read from the start of the file to detect its encoding
+ENCODING_SAMPLE_SIZE = 1024 * 1024
+
+VALID_BOARDS = ('CBSE', 'ICSE', 'IB', 'IGCSE', 'State')
+
+CURRICULUM_WEBSITES = {
+    'CBSE': 'https://www.cbse.gov.in',
+    'ICSE': 'https://www.cisce.org',
+    'IB': 'https://www.ibo.org',
+    'IGCSE': 'https://www.cambridgeinternational.org'
+}
+
+# Scraped address lines that are opening-hours or separator noise, not addresses
+PLACEHOLDER_ADDRESS_LINES = ('·', 'Closed', 'Closes soon')
+
+# Maximum lengths of the School columns filled from the CSV
+FIELD_LIMITS = {
+    'name': 200,
+    'location': 200,
+    'pin_code': 10,
+    'syllabus': 100,
+    'board': 50,
+    'phone_number': 20,
+    'address_line_1': 200,
+    'address_line_2': 200,
+}
+
+# Look for patterns like - 600013 or 600013 or Tamil Nadu 600013
+PIN_CODE_RE = re.compile(r'[-]?\s*(\d{6})')
+# Phone numbers after a separator (patterns like � 096770 15266 or - 082207 66633)
+PHONE_AFTER_SYMBOL_RE = re.compile(r'[�–—]\s*\d{10,11}')
+PHONE_AFTER_DASH_RE = re.compile(r'[-]\s*\d{10,11}')
+WHITESPACE_RE = re.compile(r'\s+')
+BRACKETS_RE = re.compile(r'[()]')
+TRIPLE_QUOTED_RE = re.compile(r'^["\']{3}(.*)["\']{3}$')
+QUOTED_RE = re.compile(r'^["\'](.*)["\']$')
+
+
+def detect_encoding(path, sample_size=ENCODING_SAMPLE_SIZE):
+    """
+    Pick the file's encoding from a byte sample: UTF-8 (BOM or not) if the
+    sample decodes as UTF-8, otherwise Latin-1, which accepts any byte.
+    """
+    with open(path, 'rb') as f:
+        sample = f.read(sample_size)
+    try:
+        # Incremental so a multi-byte character cut off at the end isn't an error
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return 'latin-1'
+    return 'utf-8-sig'
+
+
+def clean_header(fieldnames):
+    """Strip BOMs (UTF-8 \\ufeff and its Latin-1 reading ï»¿) and whitespace from header names"""
+    return [(name or '').lstrip('\ufeff').lstrip('ï»¿').strip() for name in fieldnames]
+
+
+def read_chunks(path, encoding, chunk_size):
+    """
+    Stream the CSV as record-aligned chunks of (first row number, header, rows).
+
+    The csv module does the record splitting, so quoted fields spanning
+    several lines never straddle two chunks. Row numbers count the header
+    as row 1.
+    """
+    # Undecodable bytes past the encoding sample become U+FFFD instead of aborting the import
+    with open(path, 'r', encoding=encoding, errors='replace', newline='') as f:
+        reader = csv.reader(f)
+        header = clean_header(next(reader, []))
+        rows = []
+        first_row = 2
+        for row_num, row in enumerate(reader, start=2):
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                yield first_row, header, rows
+                rows = []
+                first_row = row_num + 1
+        if rows:
+            yield first_row, header, rows
+
+
+def extract_pin_code(address):
+    """Extract pin code from address text"""
+    match = PIN_CODE_RE.search(address)
+    if match:
+        return match.group(1)
+    return "600001"  # Default Chennai pin code
+
+
+def extract_board_from_syllabus(syllabus):
+    """Extract board code from syllabus name by checking for key terms"""
+    if not syllabus or not syllabus.strip():
+        return 'CBSE'  # Default if empty
+
+    syllabus_upper = syllabus.upper()
+
+    # Check for key terms (order matters - check more specific first)
+    if 'MATRICULATION' in syllabus_upper:
+        return 'State'
+    elif 'CBSE' in syllabus_upper:
+        return 'CBSE'
+    elif 'IB' in syllabus_upper:
+        return 'IB'
+    elif 'IGCSE' in syllabus_upper:
+        return 'IGCSE'
+    elif 'ICSE' in syllabus_upper:
+        return 'ICSE'
+    else:
+        return 'CBSE'  # Default to CBSE
+
+
+def infer_co_ed_type(name):
+    """Infer co-ed type from school name"""
+    if not name:
+        return 'C'  # Default to Co-ed
+
+    name_lower = name.lower()
+    if 'boys' in name_lower or 'boy' in name_lower:
+        return 'B'
+    elif 'girls' in name_lower or 'girl' in name_lower:
+        return 'G'
+    else:
+        return 'C'  # Default to Co-ed
+
+
+def clean_address(address):
+    """Clean address by removing phone numbers and special characters"""
+    address = PHONE_AFTER_SYMBOL_RE.sub('', address)
+    address = PHONE_AFTER_DASH_RE.sub('', address)
+    # Clean up extra spaces
+    return WHITESPACE_RE.sub(' ', address).strip()
+
+
+def parse_review_count(review_count_str):
+    """Parse review count, handling formats like (122), 122, or empty"""
+    if not review_count_str or not review_count_str.strip():
+        return 0
+
+    # Remove brackets if present
+    review_count_str = BRACKETS_RE.sub('', review_count_str.strip())
+
+    try:
+        return int(review_count_str)
+    except ValueError:
+        return 0
+
+
+def parse_rating(rating_str):
+    """Parse rating from string, return 0.0 if empty or invalid"""
+    if not rating_str or not rating_str.strip():
+        return 0.0
+
+    try:
+        rating = float(rating_str.strip())
+    except ValueError:
+        return 0.0
+    # Ensure rating is between 0 and 5
+    return min(max(rating, 0.0), 5.0)
+
+
+def combine_address_lines(line1, line2):
+    """Combine two address lines, filtering out placeholder values"""
+    parts = [
+        line.strip() for line in (line1, line2)
+        if line and line.strip() and line.strip() not in PLACEHOLDER_ADDRESS_LINES
+    ]
+    # Clean up extra spaces
+    return WHITESPACE_RE.sub(' ', ', '.join(parts)).strip()
+
+
+def clean_review_text(review_text):
+    """Clean review text by removing extra quotes and whitespace"""
+    if not review_text or not review_text.strip():
+        return ''
+
+    # Remove surrounding quotes (handles both single and triple quotes)
+    cleaned = review_text.strip()
+    cleaned = TRIPLE_QUOTED_RE.sub(r'\1', cleaned)
+    cleaned = QUOTED_RE.sub(r'\1', cleaned)
+    # Clean up extra spaces
+    return WHITESPACE_RE.sub(' ', cleaned).strip()
+
+
+def clean_row(row):
+    """
+    Clean and validate one CSV record (a dict keyed by header name) into
+    School field values. Raises ValueError when the row can't be imported.
+    """
+    def column(*names):
+        # First non-empty column; older CSV exports use different headers
+        for name in names:
+            value = (row.get(name) or '').strip()
+            if value:
+                return value
+        return ''
+
+    school_name = column('School Name')
+    if not school_name:
+        raise ValueError('Missing school name')
+
+    curriculum = column('Curriculum', 'Syllabus')
+    address_line_1 = column('1st Address line')
+    address_line_2 = column('2nd Address line')
+    board = extract_board_from_syllabus(curriculum)
+
+    google_maps_link = column('Google Maps URL', 'Google Maps Direction')[:500]
+
+    # Combine address lines, truncated to fit the location field
+    combined_address = combine_address_lines(address_line_1, address_line_2)
+    if len(combined_address) > 200:
+        combined_address = combined_address[:197] + '...'
+
+    # The maps URL carries the full address; its pin code beats one guessed from the address lines
+    pin_code = parse_google_maps_url(google_maps_link)['pin_code'] or extract_pin_code(combined_address)
+
+    fields = {
+        'name': school_name[:200],
+        'location': combined_address[:200],
+        'pin_code': pin_code[:10],
+        'board': board if board in VALID_BOARDS else 'CBSE',
+        'grades_offered': '',  # Not in CSV - leave empty
+        'co_ed_type': infer_co_ed_type(school_name),
+        'distance': 0.0,  # Not in CSV - set to 0
+        'bus_availability': False,  # Required field, default to False
+        'syllabus': curriculum[:100],
+        # URLs - truncate to 500 chars to be safe
+        'website': column('Website')[:500],
+        'curriculum_website': CURRICULUM_WEBSITES.get(board, '')[:500],
+        'google_maps_link': google_maps_link,
+        'rating': parse_rating(column('Rating')),
+        'fees_by_grade': '',  # Not in CSV - leave empty (will show "No data")
+        'phone_number': column('Phone Number')[:20],
+        'review_count': parse_review_count(column('Review Count')),
+        'address_line_1': address_line_1[:200],
+        'address_line_2': address_line_2[:200],
+        'top_review': clean_review_text(column('Reviews')),
+    }
+
+    for field, limit in FIELD_LIMITS.items():
+        if len(fields[field]) > limit:
+            raise ValueError(f'{field} too long: {len(fields[field])}')
+    return fields
+
+
+def clean_chunk(chunk):
+    """
+    Clean a chunk from read_chunks; runs in a worker process.
+
+    Returns [(row number, fields or None, error message or None), ...] in
+    file order.
+    """
+    first_row, header, rows = chunk
+    results = []
+    for row_num, values in enumerate(rows, start=first_row):
+        row = {name: value for name, value in zip(header, values) if name}
+        try:
+            results.append((row_num, clean_row(row), None))
+        except Exception as e:
+            results.append((row_num, None, str(e)))
+    return results
+
+
+def clean_chunks(chunks, workers):
+    """
+    Clean chunks in a pool of worker processes, yielding results in file order.
+
+    At most two chunks per worker are in flight, so memory stays bounded
+    however large the file is. workers <= 1 cleans in this process.
+    Workers are spawned rather than forked so they never inherit the
+    caller's open database connection.
+    """
+    if workers <= 1:
+        yield from map(clean_chunk, chunks)
+        return
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(clean_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
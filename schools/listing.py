@@ -0,0 +1,60 @@
+"""Lean rows for the search results listing, fetched with only the columns the cards show"""
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import School
+
+
+# School columns shown on a result card
+LISTING_FIELDS = ('id', 'name', 'location', 'rating', 'review_count', 'default_fee', 'board', 'image', 'updated_at')
+
+# Facility names shown per card
+LISTING_FACILITIES = 2
+
+
+class SchoolListing:
+    """One result card: the listed columns plus the first facility names"""
+    __slots__ = LISTING_FIELDS + ('image_url', 'facility_names', 'calculated_distance', 'card_html')
+
+    def __init__(self, values, image_url, facility_names):
+        for field, value in zip(LISTING_FIELDS, values):
+            setattr(self, field, value)
+        self.image_url = image_url
+        self.facility_names = facility_names
+        self.calculated_distance = None
+        self.card_html = ''
+
+    @property
+    def pk(self):
+        return self.id
+
+
+def facility_names(school_ids, limit=LISTING_FACILITIES):
+    """
+    {school_id: [facility name, ...]} with the first `limit` facilities of
+    each school (by facility ID), numbered and cut off by the database.
+    """
+    links = School.facilities.through.objects.filter(school_id__in=school_ids).annotate(
+        position=Window(RowNumber(), partition_by=F('school_id'), order_by=F('facility_id').asc())
+    ).filter(position__lte=limit).order_by('school_id', 'facility_id')
+    names = {}
+    for school_id, name in links.values_list('school_id', 'facility__name'):
+        names.setdefault(school_id, []).append(name)
+    return names
+
+
+def listing_rows(school_ids):
+    """SchoolListing rows for the given IDs, in that order (missing IDs are skipped)"""
+    school_ids = list(school_ids)
+    values = {row[0]: row for row in School.objects.filter(pk__in=school_ids).values_list(*LISTING_FIELDS)}
+    names = facility_names(school_ids)
+    storage = School._meta.get_field('image').storage
+    image_index = LISTING_FIELDS.index('image')
+    return [
+        SchoolListing(
+            values[pk],
+            storage.url(values[pk][image_index]) if values[pk][image_index] else '',
+            names.get(pk, []),
+        )
+        for pk in school_ids if pk in values
+    ]
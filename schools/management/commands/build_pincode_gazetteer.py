@@ -0,0 +1,83 @@
+import csv
+import os
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from schools.gazetteer import RECORD, gazetteer_path, write_gazetteer
+from schools.importing import clean_header, detect_encoding
+
+
+# Header names recognised for each column, compared case-insensitively
+PIN_COLUMNS = ('pincode', 'pin_code', 'pin code', 'pin', 'postalcode', 'postal_code')
+LAT_COLUMNS = ('latitude', 'lat')
+LON_COLUMNS = ('longitude', 'lon', 'lng', 'long')
+
+
+class Command(BaseCommand):
+    help = 'Build the pin-code gazetteer file used for distance search from a pin-code dataset CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'csv_file',
+            type=str,
+            help='CSV with a pin code, latitude and longitude column (e.g. the All India Pincode Directory)'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Gazetteer file to write (default: settings.PINCODE_GAZETTEER_PATH)'
+        )
+
+    def find_column(self, header, candidates):
+        lowered = [name.lower() for name in header]
+        for candidate in candidates:
+            if candidate in lowered:
+                return lowered.index(candidate)
+        return None
+
+    def handle(self, *args, **options):
+        csv_file = options['csv_file']
+        output = options['output'] or gazetteer_path()
+
+        if not os.path.exists(csv_file):
+            self.stdout.write(self.style.ERROR(f'CSV file not found: {csv_file}'))
+            return
+
+        # Several post offices can share a pin code: average their coordinates
+        sums = defaultdict(lambda: [0.0, 0.0, 0])
+        skipped = 0
+        with open(csv_file, 'r', encoding=detect_encoding(csv_file), errors='replace', newline='') as f:
+            reader = csv.reader(f)
+            header = clean_header(next(reader, []))
+            columns = [self.find_column(header, names) for names in (PIN_COLUMNS, LAT_COLUMNS, LON_COLUMNS)]
+            if None in columns:
+                self.stdout.write(self.style.ERROR(
+                    f'Could not find pin code, latitude and longitude columns in: {", ".join(header)}'
+                ))
+                return
+            pin_col, lat_col, lon_col = columns
+
+            for row in reader:
+                try:
+                    pin = row[pin_col].strip()
+                    lat, lon = float(row[lat_col]), float(row[lon_col])
+                except (IndexError, ValueError):
+                    skipped += 1
+                    continue
+                if len(pin) != 6 or not pin.isdigit() or not (-90 <= lat <= 90 and -180 <= lon <= 180) \
+                        or (lat == 0 and lon == 0):
+                    skipped += 1
+                    continue
+                entry = sums[int(pin)]
+                entry[0] += lat
+                entry[1] += lon
+                entry[2] += 1
+
+        centroids = {pin: (lat / n, lon / n) for pin, (lat, lon, n) in sums.items()}
+        write_gazetteer(output, centroids)
+
+        size_kb = (len(centroids) * RECORD.size) / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {len(centroids)} pin codes ({size_kb:.0f} KB) to {output}; skipped {skipped} rows.'
+        ))
+        self.stdout.write('Run "python manage.py refresh_school_fields" to recompute school coordinates.')
@@ -1,13 +1,30 @@
-import csv
-import re
+import hashlib
 import os
+import time
 from django.core.management.base import BaseCommand
-from django.db import transaction
-from schools.models import School, Facility
+from django.db import connection, transaction
+from django.utils import timezone
+from schools.bitmap_index import school_index
+from schools.caching import bump_dataset_version
+from schools.distances import school_coordinates
+from schools.importing import clean_chunks, detect_encoding, read_chunks
+from schools.models import Review, School, SchoolFee, prime_fee_schedules
+from schools.name_search import name_index
+from schools.typeahead import typeahead_index
+from schools.utils import normalize_school_name
+
+
+# School columns filled from the CSV; their values make up a row's content hash
+IMPORT_FIELDS = [
+    'name', 'location', 'pin_code', 'board', 'grades_offered', 'co_ed_type', 'distance',
+    'bus_availability', 'syllabus', 'website', 'curriculum_website', 'google_maps_link',
+    'rating', 'fees_by_grade', 'phone_number', 'review_count', 'address_line_1',
+    'address_line_2', 'top_review',
+]
 
 
 class Command(BaseCommand):
-    help = 'Import schools from CSV file and clear all existing school data'
+    help = 'Import schools from CSV file and clear all existing school data (or upsert with --incremental)'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -15,361 +32,211 @@ class Command(BaseCommand):
             type=str,
             help='Path to the CSV file to import'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of rows per worker chunk and per insert query (default: 500)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes cleaning rows; 1 cleans in this process (default: CPU count)'
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only insert, update or delete schools whose CSV content changed, '
+                 'keeping the IDs, reviews and timestamps of unchanged schools'
+        )
 
-    def extract_pin_code(self, address):
-        """Extract pin code from address text"""
-        # Look for patterns like - 600013 or 600013 or Tamil Nadu 600013
-        match = re.search(r'[-]?\s*(\d{6})', address)
-        if match:
-            return match.group(1)
-        return "600001"  # Default Chennai pin code
-
-    def extract_board_from_syllabus(self, syllabus):
-        """Extract board code from syllabus name by checking for key terms"""
-        if not syllabus or not syllabus.strip():
-            return 'CBSE'  # Default if empty
-        
-        syllabus_upper = syllabus.upper()
-        
-        # Check for key terms (order matters - check more specific first)
-        if 'MATRICULATION' in syllabus_upper:
-            return 'State'
-        elif 'CBSE' in syllabus_upper:
-            return 'CBSE'
-        elif 'IB' in syllabus_upper:
-            return 'IB'
-        elif 'IGCSE' in syllabus_upper:
-            return 'IGCSE'
-        elif 'ICSE' in syllabus_upper:
-            return 'ICSE'
-        else:
-            return 'CBSE'  # Default to CBSE
-
-    def get_curriculum_website(self, board):
-        """Get curriculum website based on board"""
-        websites = {
-            'CBSE': 'https://www.cbse.gov.in',
-            'ICSE': 'https://www.cisce.org',
-            'IB': 'https://www.ibo.org',
-            'IGCSE': 'https://www.cambridgeinternational.org'
-        }
-        return websites.get(board, '')
+    def school_key(self, school):
+        """Natural key: normalized name plus the Google place ID, or the pin code when the URL has none"""
+        place = school.place_id or school.pin_code
+        return f'{normalize_school_name(school.name)}|{place}'
+
+    def content_hash(self, school):
+        """SHA-1 over the imported column values of a school"""
+        content = '\x1f'.join(str(getattr(school, field)) for field in IMPORT_FIELDS)
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def school_batches(self, chunks, errors):
+        """
+        Turn cleaned chunks into batches of unsaved School instances, in file
+        order. Invalid rows are collected in errors and skipped.
+        """
+        for results in chunks:
+            schools = []
+            for row_num, fields, error in results:
+                if error:
+                    errors.append(f'Row {row_num}: {error}')
+                    if len(errors) <= 10:  # Only print first 10 errors to avoid spam
+                        self.stdout.write(self.style.WARNING(f'Error processing row {row_num}: {error}'))
+                    continue
+                schools.append(School(**fields))
+            # Fee strings repeat across rows; parse each distinct one once for
+            # the default fee and the SchoolFee rows
+            prime_fee_schedules(schools)
+            for school in schools:
+                # bulk_create bypasses save(), so fill the derived columns here
+                school.update_derived_fields()
+                school.import_hash = self.content_hash(school)
+            yield schools
+
+    def write_fees(self, schools, batch_size):
+        SchoolFee.objects.bulk_create(
+            [fee for school in schools for fee in school.get_fee_rows()],
+            batch_size=batch_size,
+        )
 
-    def infer_co_ed_type(self, name):
-        """Infer co-ed type from school name"""
-        if not name:
-            return 'C'  # Default to Co-ed
-        
-        name_lower = name.lower()
-        if 'boys' in name_lower or 'boy' in name_lower:
-            return 'B'
-        elif 'girls' in name_lower or 'girl' in name_lower:
-            return 'G'
-        else:
-            return 'C'  # Default to Co-ed
-    
-    def clean_address(self, address):
-        """Clean address by removing phone numbers and special characters"""
-        # Remove phone numbers (patterns like � 096770 15266 or - 082207 66633)
-        address = re.sub(r'[�–—]\s*\d{10,11}', '', address)
-        address = re.sub(r'[-]\s*\d{10,11}', '', address)
-        # Clean up extra spaces
-        address = re.sub(r'\s+', ' ', address).strip()
-        return address
-    
-    def parse_review_count(self, review_count_str):
-        """Parse review count, handling formats like (122), 122, or empty"""
-        if not review_count_str or not review_count_str.strip():
-            return 0
-        
-        review_count_str = review_count_str.strip()
-        # Remove brackets if present
-        review_count_str = re.sub(r'[()]', '', review_count_str)
-        
-        try:
-            return int(review_count_str)
-        except ValueError:
-            return 0
-    
-    def parse_rating(self, rating_str):
-        """Parse rating from string, return 0.0 if empty or invalid"""
-        if not rating_str or not rating_str.strip():
-            return 0.0
-        
-        try:
-            rating = float(rating_str.strip())
-            # Ensure rating is between 0 and 5
-            if rating < 0:
-                return 0.0
-            if rating > 5:
-                return 5.0
-            return rating
-        except ValueError:
-            return 0.0
-    
-    def combine_address_lines(self, line1, line2):
-        """Combine two address lines, filtering out placeholder values"""
-        parts = []
-        
-        # Clean and add first line
-        if line1 and line1.strip() and line1.strip() not in ['·', 'Closed', 'Closes soon']:
-            parts.append(line1.strip())
-        
-        # Clean and add second line
-        if line2 and line2.strip() and line2.strip() not in ['·', 'Closed', 'Closes soon']:
-            parts.append(line2.strip())
-        
-        combined = ', '.join(parts)
-        # Clean up extra spaces
-        combined = re.sub(r'\s+', ' ', combined).strip()
-        return combined
-    
-    def clean_review_text(self, review_text):
-        """Clean review text by removing extra quotes and whitespace"""
-        if not review_text or not review_text.strip():
-            return ''
-        
-        # Remove surrounding quotes (handles both single and triple quotes)
-        cleaned = review_text.strip()
-        # Remove triple quotes if present
-        cleaned = re.sub(r'^["\']{3}(.*)["\']{3}$', r'\1', cleaned)
-        # Remove single quotes if present
-        cleaned = re.sub(r'^["\'](.*)["\']$', r'\1', cleaned)
-        # Clean up extra spaces
-        cleaned = re.sub(r'\s+', ' ', cleaned).strip()
-        return cleaned
+    def delete_all(self):
+        """
+        Delete every school with its reviews, fees and facility links, one
+        plain SQL DELETE per table, referencing tables first. The ORM's
+        collector and per-row signal handlers are skipped; handle()
+        invalidates the indexes and bumps the dataset version once instead.
+        """
+        with connection.cursor() as cursor:
+            for model in (Review, SchoolFee, School.facilities.through, School):
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+
+    def replace_all(self, batches, batch_size):
+        """Delete every school and bulk-insert the imported ones as batches arrive"""
+        self.delete_all()
+        # A repeated key keeps its first row, as in upsert(), so an
+        # --incremental run over the same file finds nothing to change
+        seen = set()
+        created = duplicates = 0
+        for schools in batches:
+            unique = []
+            for school in schools:
+                key = self.school_key(school)
+                if key in seen:
+                    duplicates += 1
+                else:
+                    seen.add(key)
+                    unique.append(school)
+            School.objects.bulk_create(unique, batch_size=batch_size)
+            self.write_fees(unique, batch_size)
+            created += len(unique)
+            self.stdout.write(f'Imported {created} schools...')
+        return {'created': created, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'duplicates': duplicates}
+
+    def upsert(self, batches, batch_size):
+        """
+        Match imported schools to existing ones by school_key and write only
+        the differences: new keys are inserted, keys whose content hash changed
+        are updated in place, and keys missing from the CSV are deleted.
+        """
+        existing = {}
+        duplicates = []
+        # Oldest first, so the row kept for a repeated key is the one imported first
+        for current in School.objects.only('id', 'name', 'place_id', 'pin_code', 'import_hash').order_by('pk'):
+            key = self.school_key(current)
+            if key in existing:
+                duplicates.append(current.pk)
+            else:
+                existing[key] = current
+
+        # Keys already seen in this run; a repeated key in the CSV keeps its first row
+        seen = set()
+        counts = {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'duplicates': 0}
+        now = timezone.now()
+        for schools in batches:
+            to_create = []
+            to_update = []
+            for school in schools:
+                key = self.school_key(school)
+                if key in seen:
+                    counts['duplicates'] += 1
+                    continue
+                seen.add(key)
+                current = existing.pop(key, None)
+                if current is None:
+                    to_create.append(school)
+                elif current.import_hash != school.import_hash:
+                    school.pk = current.pk
+                    school.updated_at = now
+                    to_update.append(school)
+                else:
+                    counts['unchanged'] += 1
+
+            School.objects.bulk_create(to_create, batch_size=batch_size)
+            School.objects.bulk_update(
+                to_update,
+                IMPORT_FIELDS + School.DERIVED_FIELDS + ['import_hash', 'updated_at'],
+                batch_size=batch_size,
+            )
+            SchoolFee.objects.filter(school__in=[school.pk for school in to_update]).delete()
+            self.write_fees(to_create + to_update, batch_size)
+            counts['created'] += len(to_create)
+            counts['updated'] += len(to_update)
+
+        if seen:
+            to_delete = [current.pk for current in existing.values()] + duplicates
+            School.objects.filter(pk__in=to_delete).delete()
+            counts['deleted'] = len(to_delete)
+        return counts
 
     def handle(self, *args, **options):
         csv_file = options['csv_file']
-        
+
         if not os.path.exists(csv_file):
             self.stdout.write(self.style.ERROR(f'CSV file not found: {csv_file}'))
             return
 
-        # Clear all existing schools
-        self.stdout.write('Clearing all existing schools...')
-        School.objects.all().delete()
-        self.stdout.write(self.style.SUCCESS('All existing schools deleted.'))
-
-        # Read and import CSV
         self.stdout.write(f'Reading CSV file: {csv_file}')
-        schools_created = 0
-        errors = []
-
-        try:
-            # Try different encodings
-            encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
-            file_handle = None
-            reader = None
-            
-            for encoding in encodings:
-                try:
-                    file_handle = open(csv_file, 'r', encoding=encoding)
-                    test_reader = csv.DictReader(file_handle)
-                    # Try reading first row to test encoding
-                    next(test_reader)
-                    file_handle.seek(0)  # Reset to beginning
-                    # Create reader and strip BOM from fieldnames
-                    reader = csv.DictReader(file_handle)
-                    # Strip BOM from fieldnames (handle both UTF-8 BOM \ufeff and latin-1 BOM ï»¿)
-                    if reader.fieldnames:
-                        reader.fieldnames = [
-                            name.lstrip('\ufeff').lstrip('ï»¿').strip() if name else name 
-                            for name in reader.fieldnames
-                        ]
-                        # Remove None entries
-                        reader.fieldnames = [name for name in reader.fieldnames if name]
-                    self.stdout.write(f'Using encoding: {encoding}')
-                    break
-                except (UnicodeDecodeError, StopIteration):
-                    if file_handle:
-                        file_handle.close()
-                        file_handle = None
-                    continue
-            
-            if not reader or not file_handle:
-                self.stdout.write(self.style.ERROR('Could not read CSV file with any encoding'))
-                return
-            
-            # Process rows without atomic transaction to allow partial success
-            for row_num, row in enumerate(reader, start=2):  # Start at 2 because row 1 is header
-                try:
-                    # New CSV format columns
-                    school_name = row.get('School Name', '').strip()
-                    rating_str = row.get('Rating', '').strip()
-                    review_count_str = row.get('Review Count', '').strip()
-                    curriculum = row.get('Curriculum', '').strip()
-                    address_line_1 = row.get('1st Address line', '').strip()
-                    address_line_2 = row.get('2nd Address line', '').strip()
-                    phone_number = row.get('Phone Number', '').strip()
-                    website = row.get('Website', '').strip()
-                    google_maps_link = row.get('Google Maps URL', '').strip()
-                    top_review = row.get('Reviews', '').strip()
-                    
-                    # Fallback to old CSV format if new columns not found
-                    if not school_name:
-                        school_name = row.get('School Name', '').strip()
-                    if not curriculum:
-                        curriculum = row.get('Syllabus', '').strip()
-                    if not google_maps_link:
-                        google_maps_link = row.get('Google Maps Direction', '').strip()
-                    
-                    if not school_name:
-                        errors.append(f'Row {row_num}: Missing school name')
-                        continue
-
-                    # Extract board from curriculum (same as syllabus)
-                    board = self.extract_board_from_syllabus(curriculum)
-                    
-                    # Infer co_ed_type from school name
-                    co_ed_type = self.infer_co_ed_type(school_name)
-                    
-                    # Combine address lines
-                    combined_address = self.combine_address_lines(address_line_1, address_line_2)
-                    
-                    # Truncate combined address to fit location field (200 chars max)
-                    if len(combined_address) > 200:
-                        combined_address = combined_address[:197] + '...'
-                    
-                    # Extract pin code from combined address
-                    pin_code = self.extract_pin_code(combined_address)
-                    
-                    # Parse rating and review count
-                    rating = self.parse_rating(rating_str)
-                    review_count = self.parse_review_count(review_count_str)
-                    
-                    # Ensure all fields are strings and properly truncated
-                    final_name = str(school_name)[:200] if school_name else 'Unknown School'
-                    final_location = str(combined_address)[:200] if combined_address else ''
-                    final_pin_code = str(pin_code)[:10] if pin_code else '600001'
-                    final_syllabus = str(curriculum)[:100] if curriculum else ''
-                    final_board = str(board)[:50] if board else 'CBSE'
-                    final_phone = str(phone_number)[:20] if phone_number else ''
-                    final_address_line_1 = str(address_line_1)[:200] if address_line_1 else ''
-                    final_address_line_2 = str(address_line_2)[:200] if address_line_2 else ''
-                    final_top_review = self.clean_review_text(top_review)
-                    
-                    # Ensure board is a valid choice
-                    valid_boards = ['CBSE', 'ICSE', 'IB', 'IGCSE', 'State']
-                    if final_board not in valid_boards:
-                        final_board = 'CBSE'
-                    
-                    # URLs - truncate to reasonable length (some databases may have constraints)
-                    # URLField should handle long URLs, but truncate to 500 chars to be safe
-                    final_website = str(website)[:500] if website else ''
-                    final_curriculum_website = str(self.get_curriculum_website(board))[:500] if board else ''
-                    final_google_maps_link = str(google_maps_link)[:500] if google_maps_link else ''
-                    
-                    # Double-check all string lengths and log if any are too long
-                    field_lengths = {
-                        'name': len(final_name),
-                        'location': len(final_location),
-                        'pin_code': len(final_pin_code),
-                        'syllabus': len(final_syllabus),
-                        'board': len(final_board),
-                        'phone': len(final_phone),
-                        'address_line_1': len(final_address_line_1),
-                        'address_line_2': len(final_address_line_2),
-                        'website': len(final_website),
-                        'google_maps_link': len(final_google_maps_link),
-                    }
-                    
-                    # Validate lengths
-                    if field_lengths['name'] > 200:
-                        raise ValueError(f"Name too long: {field_lengths['name']}")
-                    if field_lengths['location'] > 200:
-                        raise ValueError(f"Location too long: {field_lengths['location']}")
-                    if field_lengths['pin_code'] > 10:
-                        raise ValueError(f"Pin code too long: {field_lengths['pin_code']}")
-                    if field_lengths['syllabus'] > 100:
-                        raise ValueError(f"Syllabus too long: {field_lengths['syllabus']}")
-                    if field_lengths['board'] > 50:
-                        raise ValueError(f"Board too long: {field_lengths['board']}")
-                    if field_lengths['phone'] > 20:
-                        raise ValueError(f"Phone too long: {field_lengths['phone']}")
-                    if field_lengths['address_line_1'] > 200:
-                        raise ValueError(f"Address line 1 too long: {field_lengths['address_line_1']}")
-                    if field_lengths['address_line_2'] > 200:
-                        raise ValueError(f"Address line 2 too long: {field_lengths['address_line_2']}")
-                    
-                    # Create school with all fields (existing + new)
-                    school = School(
-                        name=final_name,
-                        location=final_location,
-                        pin_code=final_pin_code,
-                        board=final_board,
-                        grades_offered='',  # Not in CSV - leave empty
-                        co_ed_type=co_ed_type,  # Inferred from school name
-                        distance=0.0,  # Not in CSV - set to 0
-                        bus_availability=False,  # Required field, default to False
-                        syllabus=final_syllabus,
-                        website=final_website,
-                        curriculum_website=final_curriculum_website,
-                        google_maps_link=final_google_maps_link,
-                        rating=rating,  # From Rating column
-                        fees_by_grade='',  # Not in CSV - leave empty (will show "No data")
-                        # New fields
-                        phone_number=final_phone,
-                        review_count=review_count,
-                        address_line_1=final_address_line_1,
-                        address_line_2=final_address_line_2,
-                        top_review=final_top_review,
-                    )
-                    school.save()
-                    schools_created += 1
-                    
-                    if schools_created % 50 == 0:
-                        self.stdout.write(f'Imported {schools_created} schools...')
+        started = time.perf_counter()
+        encoding = detect_encoding(csv_file)
+        self.stdout.write(f'Using encoding: {encoding}')
 
-                except Exception as e:
-                    error_msg = str(e)
-                    # Add more context for debugging
-                    debug_info = []
-                    if 'school_name' in locals():
-                        debug_info.append(f'Name len: {len(final_name) if "final_name" in locals() else len(school_name)}')
-                    if 'final_location' in locals():
-                        debug_info.append(f'Location len: {len(final_location)}')
-                    if 'final_address_line_1' in locals():
-                        debug_info.append(f'Addr1 len: {len(final_address_line_1)}')
-                    if 'final_address_line_2' in locals():
-                        debug_info.append(f'Addr2 len: {len(final_address_line_2)}')
-                    if 'final_website' in locals():
-                        debug_info.append(f'Website len: {len(final_website)}')
-                    if 'final_google_maps_link' in locals():
-                        debug_info.append(f'Maps len: {len(final_google_maps_link)}')
-                    if 'final_syllabus' in locals():
-                        debug_info.append(f'Syllabus len: {len(final_syllabus)}')
-                    if 'final_board' in locals():
-                        debug_info.append(f'Board: {final_board}')
-                    
-                    if debug_info:
-                        error_msg += f' | {" | ".join(debug_info)}'
-                    # Add field lengths if available
-                    if 'field_lengths' in locals():
-                        error_msg += f' | Field lengths: {field_lengths}'
-                    errors.append(f'Row {row_num}: {error_msg}')
-                    if len(errors) <= 10:  # Only print first 10 errors to avoid spam
-                        self.stdout.write(self.style.WARNING(f'Error processing row {row_num}: {error_msg}'))
-            
-            # Close file handle
-            if file_handle:
-                file_handle.close()
-
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error reading CSV file: {str(e)}'))
-            if file_handle:
-                file_handle.close()
+        # Rows stream through the worker pool in record-aligned chunks and come
+        # back in file order to this process, the only one writing to the database
+        batch_size = options['batch_size']
+        errors = []
+        chunks = clean_chunks(read_chunks(csv_file, encoding, batch_size), options['workers'])
+        batches = self.school_batches(chunks, errors)
+
+        # Write in one transaction so readers never see a half-imported catalogue
+        with transaction.atomic():
+            if options['incremental']:
+                counts = self.upsert(batches, batch_size)
+            else:
+                counts = self.replace_all(batches, batch_size)
+            imported = counts['created'] + counts['updated'] + counts['unchanged']
+            if not imported:
+                transaction.set_rollback(True)
+        elapsed = time.perf_counter() - started
+
+        if not imported:
+            self.stdout.write(self.style.ERROR('No valid rows found; existing schools were left untouched.'))
             return
 
+        # Bulk writes send no post_save signals: rebuild this process's indexes,
+        # and bump the dataset version so cached searches and other processes follow.
+        # An incremental run that changed nothing leaves every cache valid.
+        if counts['created'] or counts['updated'] or counts['deleted']:
+            school_index.invalidate()
+            name_index.invalidate()
+            school_coordinates.invalidate()
+            typeahead_index.invalidate()
+            bump_dataset_version()
+
         # Summary
-        self.stdout.write(self.style.SUCCESS(f'\nSuccessfully imported {schools_created} schools!'))
-        
+        self.stdout.write(self.style.SUCCESS(
+            f'\nSuccessfully imported {imported} schools in {elapsed:.2f}s '
+            f'({imported / max(elapsed, 1e-6):.0f} rows/s)!'
+        ))
+        self.stdout.write(
+            f"{counts['created']} created, {counts['updated']} updated, "
+            f"{counts['deleted']} deleted, {counts['unchanged']} unchanged, "
+            f"{counts['duplicates']} duplicate rows skipped"
+        )
+
         if errors:
             self.stdout.write(self.style.WARNING(f'\n{len(errors)} errors occurred:'))
             for error in errors[:10]:  # Show first 10 errors
                 self.stdout.write(self.style.WARNING(f'  - {error}'))
             if len(errors) > 10:
                 self.stdout.write(self.style.WARNING(f'  ... and {len(errors) - 10} more errors'))
-
-
-
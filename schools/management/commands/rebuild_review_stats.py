@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from schools.caching import bump_dataset_version
+from schools.models import School
+
+
+class Command(BaseCommand):
+    help = 'Recount School rating counters and review averages from the Review table after loaddata or bulk edits'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            School.objects.all().rebuild_rating_counts()
+        # Queryset updates bypass the signals that normally bump the version
+        bump_dataset_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt review statistics for {School.objects.count()} schools.'
+        ))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from schools.caching import bump_dataset_version
+from schools.models import School, SchoolFee, prime_fee_schedules
+
+
+class Command(BaseCommand):
+    help = 'Recompute derived School columns and SchoolFee rows after loaddata or bulk edits'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of schools to update per query (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        schools = prime_fee_schedules(School.objects.all())
+        now = timezone.now()
+        for school in schools:
+            school.update_derived_fields()
+            # bulk_update skips auto_now; cached pages and fragments are keyed on updated_at
+            school.updated_at = now
+
+        with transaction.atomic():
+            School.objects.bulk_update(
+                schools,
+                School.DERIVED_FIELDS + ['updated_at'],
+                batch_size=options['batch_size'],
+            )
+            SchoolFee.objects.all().delete()
+            SchoolFee.objects.bulk_create(
+                [fee for school in schools for fee in school.get_fee_rows()],
+                batch_size=options['batch_size'],
+            )
+        # bulk_update bypasses the signals that normally bump the version
+        bump_dataset_version()
+        self.stdout.write(self.style.SUCCESS(f'Refreshed derived fields for {len(schools)} schools.'))
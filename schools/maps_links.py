@@ -0,0 +1,65 @@
+"""
+Google Maps URL parsing.
+
+Plain Python without Django imports: the import_schools_csv worker
+processes use it to clean rows, and they never set Django up.
+"""
+import re
+from urllib.parse import unquote_plus
+
+
+# Place identifiers in Google Maps URLs: an explicit place ID, or the feature ID
+# ("!1s0x...:0x...") embedded in the data= segment
+PLACE_ID_PATTERNS = (
+    re.compile(r'(?:query_place_id=|place_id[:=])([\w-]+)'),
+    re.compile(r'!1s(0x[0-9a-f]+:0x[0-9a-f]+)'),
+)
+
+# Coordinates in Google Maps URLs: the pin in the data= segment ("!3d<lat>!4d<lon>"),
+# the map viewport ("@<lat>,<lon>,17z") or a coordinate query parameter
+MAPS_COORDINATE_PATTERNS = (
+    re.compile(r'!3d(-?\d+(?:\.\d+)?)!4d(-?\d+(?:\.\d+)?)'),
+    re.compile(r'@(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)'),
+    re.compile(r'[?&](?:q|query|ll|destination)=(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)'),
+)
+
+# The place/destination address segment of a Google Maps URL
+MAPS_ADDRESS_RE = re.compile(r'/maps/(?:dir/[^/]*/|place/|search/)([^/?@]+)')
+
+PIN_CODE_RE = re.compile(r'\b(\d{6})\b')
+
+
+def extract_place_id(url):
+    """Google place or feature ID from a Google Maps URL, or '' if it has none"""
+    for pattern in PLACE_ID_PATTERNS:
+        match = pattern.search(url or '')
+        if match:
+            return match.group(1)
+    return ''
+
+
+def parse_google_maps_url(url):
+    """
+    Pull what a Google Maps URL says about a place, without any API calls.
+    
+    Returns a dict with place_id ('' if none), pin_code (the last 6-digit
+    number in the address segment, '' if none) and latitude/longitude (None
+    unless the URL carries coordinates).
+    """
+    url = url or ''
+    result = {'place_id': extract_place_id(url), 'pin_code': '', 'latitude': None, 'longitude': None}
+    
+    address = MAPS_ADDRESS_RE.search(url)
+    if address:
+        pin_codes = PIN_CODE_RE.findall(unquote_plus(address.group(1)))
+        if pin_codes:
+            result['pin_code'] = pin_codes[-1]
+    
+    for pattern in MAPS_COORDINATE_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            lat, lon = float(match.group(1)), float(match.group(2))
+            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                result['latitude'], result['longitude'] = lat, lon
+                break
+    return result
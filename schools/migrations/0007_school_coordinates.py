@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:24
+
+from django.db import migrations, models
+
+
+def approximate_pincode_coordinates(pincode):
+    """
+    Rough (lat, lon) for a pin code, as schools.utils computed it when this
+    migration was written (spread over India's bounds; not geographically
+    accurate). None for anything but a 6-digit pin code.
+    """
+    pin = ''.join(filter(str.isdigit, str(pincode)))[:6]
+    if len(pin) != 6:
+        return None
+    pin_int = int(pin)
+    lat = 20.5 + (pin_int % 10000) / 10000 * 29
+    lon = 68.0 + (pin_int // 100) % 10000 / 10000 * 29
+    return (max(8.0, min(37.0, lat)), max(68.0, min(97.0, lon)))
+
+
+def populate_coordinates(apps, schema_editor):
+    """Fill latitude/longitude for existing schools from their pin codes"""
+    School = apps.get_model('schools', 'School')
+    schools = list(School.objects.only('id', 'pin_code'))
+    for school in schools:
+        coords = approximate_pincode_coordinates(school.pin_code)
+        school.latitude, school.longitude = coords if coords else (None, None)
+    School.objects.bulk_update(schools, ['latitude', 'longitude'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0006_alter_school_curriculum_website_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='school',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='school',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='school',
+            index=models.Index(fields=['latitude', 'longitude'], name='school_lat_lon_idx'),
+        ),
+        migrations.RunPython(populate_coordinates, migrations.RunPython.noop),
+    ]
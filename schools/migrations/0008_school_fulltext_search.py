@@ -0,0 +1,72 @@
+from django.db import migrations
+
+
+# Full-text search structures as of this migration (schools.search_backends
+# creates the same ones at runtime, e.g. after SQLite table rebuilds)
+SQLITE_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS schools_school_fts USING fts5("
+    "name, location, syllabus, top_review, content='schools_school', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS schools_school_fts_ai AFTER INSERT ON schools_school BEGIN "
+    "INSERT INTO schools_school_fts(rowid, name, location, syllabus, top_review) "
+    "VALUES (new.id, new.name, new.location, new.syllabus, new.top_review); END",
+    "CREATE TRIGGER IF NOT EXISTS schools_school_fts_ad AFTER DELETE ON schools_school BEGIN "
+    "INSERT INTO schools_school_fts(schools_school_fts, rowid, name, location, syllabus, top_review) "
+    "VALUES ('delete', old.id, old.name, old.location, old.syllabus, old.top_review); END",
+    "CREATE TRIGGER IF NOT EXISTS schools_school_fts_au AFTER UPDATE ON schools_school BEGIN "
+    "INSERT INTO schools_school_fts(schools_school_fts, rowid, name, location, syllabus, top_review) "
+    "VALUES ('delete', old.id, old.name, old.location, old.syllabus, old.top_review); "
+    "INSERT INTO schools_school_fts(rowid, name, location, syllabus, top_review) "
+    "VALUES (new.id, new.name, new.location, new.syllabus, new.top_review); END",
+    "INSERT INTO schools_school_fts(schools_school_fts) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS schools_school_fts_ai",
+    "DROP TRIGGER IF EXISTS schools_school_fts_ad",
+    "DROP TRIGGER IF EXISTS schools_school_fts_au",
+    "DROP TABLE IF EXISTS schools_school_fts",
+]
+
+POSTGRES_INSTALL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS school_search_vector_idx ON schools_school USING GIN (("
+    "setweight(to_tsvector('simple'::regconfig, coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(location, '')), 'B') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(syllabus, '')), 'C') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(top_review, '')), 'D')))",
+    "CREATE INDEX IF NOT EXISTS school_name_trgm_idx ON schools_school USING GIN (name gin_trgm_ops)",
+]
+
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS school_search_vector_idx",
+    "DROP INDEX IF EXISTS school_name_trgm_idx",
+]
+
+
+def run_statements(schema_editor, statements):
+    """Run the statements for this database's vendor"""
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        for statement in statements.get(vendor, ()):
+            cursor.execute(statement)
+
+
+def install_search(apps, schema_editor):
+    """Create the backend-native full-text search structures"""
+    run_statements(schema_editor, {'postgresql': POSTGRES_INSTALL, 'sqlite': SQLITE_INSTALL})
+
+
+def uninstall_search(apps, schema_editor):
+    run_statements(schema_editor, {'postgresql': POSTGRES_UNINSTALL, 'sqlite': SQLITE_UNINSTALL})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0007_school_coordinates'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def parse_fees(fees_by_grade):
+    """Parse '12:400000,11:380000' into [(12, 400000), (11, 380000)]"""
+    fees = []
+    for item in (fees_by_grade or '').split(','):
+        grade, _, amount = item.partition(':')
+        if grade.strip().isdigit() and amount.strip().isdigit():
+            fees.append((int(grade), int(amount)))
+    return fees
+
+
+def convert_fees(apps, schema_editor):
+    """Populate SchoolFee rows and School.default_fee from the fees_by_grade strings"""
+    School = apps.get_model('schools', 'School')
+    SchoolFee = apps.get_model('schools', 'SchoolFee')
+
+    schools = list(School.objects.exclude(fees_by_grade='').only('id', 'fees_by_grade'))
+    fee_rows = []
+    for school in schools:
+        fees = parse_fees(school.fees_by_grade)
+        by_grade = dict(fees)
+        # Same rule as School.get_default_fee(): grade 12, otherwise the first listed
+        school.default_fee = by_grade.get(12) or (fees[0][1] if fees else None)
+        fee_rows.extend(SchoolFee(school_id=school.id, grade=g, amount=a) for g, a in by_grade.items())
+
+    School.objects.bulk_update(schools, ['default_fee'], batch_size=500)
+    SchoolFee.objects.bulk_create(fee_rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0008_school_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='school',
+            name='default_fee',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='SchoolFee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grade', models.PositiveSmallIntegerField()),
+                ('amount', models.PositiveIntegerField(help_text='Annual fee in ₹')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fees', to='schools.school')),
+            ],
+            options={
+                'ordering': ['school', '-grade'],
+                'indexes': [models.Index(fields=['grade', 'amount'], name='school_fee_grade_amount_idx')],
+                'constraints': [models.UniqueConstraint(fields=('school', 'grade'), name='unique_school_grade_fee')],
+            },
+        ),
+        migrations.RunPython(convert_fees, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:31
+
+from django.db import migrations, models
+
+
+def parse_grades(grades_offered):
+    """Same rule as schools.models.parse_grades: (bitmask, min_grade, max_grade)"""
+    mask = 0
+    for item in (grades_offered or '').split(','):
+        item = item.strip()
+        if item.isdigit() and int(item) <= 30:
+            mask |= 1 << int(item)
+    if not mask:
+        return 0, None, None
+    return mask, (mask & -mask).bit_length() - 1, mask.bit_length() - 1
+
+
+def populate_grades(apps, schema_editor):
+    """Populate grades_mask, min_grade and max_grade from the grades_offered strings"""
+    School = apps.get_model('schools', 'School')
+
+    schools = list(School.objects.exclude(grades_offered='').only('id', 'grades_offered'))
+    for school in schools:
+        school.grades_mask, school.min_grade, school.max_grade = parse_grades(school.grades_offered)
+    School.objects.bulk_update(schools, ['grades_mask', 'min_grade', 'max_grade'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0009_school_fees'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='school',
+            name='grades_mask',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='school',
+            name='max_grade',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='school',
+            name='min_grade',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='school',
+            index=models.Index(fields=['min_grade', 'max_grade', 'grades_mask'], name='school_grade_range_idx'),
+        ),
+        migrations.RunPython(populate_grades, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0010_school_grade_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='school',
+            name='import_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+    ]
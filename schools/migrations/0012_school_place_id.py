@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:39
+
+import re
+
+from django.db import migrations, models
+
+
+# Google Maps URL patterns as of this migration (see schools.maps_links)
+PLACE_ID_PATTERNS = (
+    re.compile(r'(?:query_place_id=|place_id[:=])([\w-]+)'),
+    re.compile(r'!1s(0x[0-9a-f]+:0x[0-9a-f]+)'),
+)
+COORDINATE_PATTERNS = (
+    re.compile(r'!3d(-?\d+(?:\.\d+)?)!4d(-?\d+(?:\.\d+)?)'),
+    re.compile(r'@(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)'),
+    re.compile(r'[?&](?:q|query|ll|destination)=(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)'),
+)
+
+
+def parse_place(url):
+    """(place ID or '', (lat, lon) or None) from a Google Maps URL"""
+    place_id = ''
+    for pattern in PLACE_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            place_id = match.group(1)
+            break
+    for pattern in COORDINATE_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            lat, lon = float(match.group(1)), float(match.group(2))
+            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                return place_id, (lat, lon)
+    return place_id, None
+
+
+def populate_places(apps, schema_editor):
+    """Fill place_id, and coordinates where the URL has them, from existing Google Maps URLs"""
+    School = apps.get_model('schools', 'School')
+    schools = list(School.objects.exclude(google_maps_link='').only('id', 'google_maps_link', 'latitude', 'longitude'))
+    for school in schools:
+        school.place_id, coordinates = parse_place(school.google_maps_link)
+        if coordinates is not None:
+            school.latitude, school.longitude = coordinates
+    School.objects.bulk_update(schools, ['place_id', 'latitude', 'longitude'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0011_school_import_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='school',
+            name='place_id',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.RunPython(populate_places, migrations.RunPython.noop),
+    ]
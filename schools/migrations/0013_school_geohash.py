@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:45
+
+from django.db import migrations, models
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(lat, lon, precision=9):
+    """Geohash of a coordinate, as schools.utils.geohash_encode computes it"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def populate_geohashes(apps, schema_editor):
+    """Fill geohash from the stored coordinates"""
+    School = apps.get_model('schools', 'School')
+    schools = list(School.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude'))
+    for school in schools:
+        school.geohash = geohash_encode(school.latitude, school.longitude)
+    School.objects.bulk_update(schools, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0012_school_place_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='school',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(populate_geohashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:46
+
+from django.db import migrations, models
+
+
+def populate_rating_counts(apps, schema_editor):
+    """Count existing reviews into the rating counters and review_average"""
+    School = apps.get_model('schools', 'School')
+    Review = apps.get_model('schools', 'Review')
+
+    counts = {}
+    for school_id, rating, count in Review.objects.values_list('school_id', 'rating').annotate(count=models.Count('id')):
+        if 1 <= rating <= 5:
+            counts.setdefault(school_id, [0] * 5)[rating - 1] = count
+    schools = list(School.objects.filter(pk__in=counts).only('id'))
+    for school in schools:
+        school_counts = counts[school.pk]
+        for stars, count in enumerate(school_counts, start=1):
+            setattr(school, f'rating_{stars}', count)
+        total = sum(school_counts)
+        school.review_average = sum(stars * count for stars, count in enumerate(school_counts, start=1)) / total
+    School.objects.bulk_update(
+        schools,
+        ['rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5', 'review_average'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0013_school_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='school',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='school',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='school',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='school',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='school',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='school',
+            name='review_average',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_rating_counts, migrations.RunPython.noop),
+    ]
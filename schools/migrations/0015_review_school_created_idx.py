@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0014_school_rating_counts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['school', '-created_at', '-id'], name='review_school_created_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:01
+
+import time
+
+from django.db import migrations, models
+
+
+def create_dataset_version(apps, schema_editor):
+    """Create the single version row, seeded from the clock"""
+    DatasetVersion = apps.get_model('schools', 'DatasetVersion')
+    DatasetVersion.objects.get_or_create(pk=1, defaults={'version': int(time.time() * 1000)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0015_review_school_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(create_dataset_version, migrations.RunPython.noop),
+    ]
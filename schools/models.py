@@ -1,5 +1,139 @@
-from django.db import models
+from array import array
+
+from django.db import models, transaction
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .maps_links import parse_google_maps_url
+from .utils import annotate_distance, geohash_encode, get_pincode_coordinates
+
+
+def parse_grades(grades_offered):
+    """
+    Parse a comma-separated grades string into (bitmask, min_grade, max_grade).
+    
+    Bit g of the mask is set when grade g is offered. Non-numeric entries are
+    ignored; an empty string gives (0, None, None).
+    """
+    mask = 0
+    for item in (grades_offered or '').split(','):
+        item = item.strip()
+        if item.isdigit() and int(item) <= 30:
+            mask |= 1 << int(item)
+    if not mask:
+        return 0, None, None
+    return mask, (mask & -mask).bit_length() - 1, mask.bit_length() - 1
+
+
+class FeeSchedule:
+    """
+    Parsed form of a fees_by_grade string ('12:400000,11:380000').
+    
+    Amounts of numeric grades up to 30 are kept in an array indexed by grade
+    (-1 where a grade has no fee); other grade labels, rare in practice, in a
+    dict. Items that aren't 'grade:amount' are skipped, and a grade listed
+    twice keeps its last amount.
+    """
+    __slots__ = ('source', '_amounts', '_labels', '_first_grade')
+    
+    MISSING = -1
+    MAX_INDEXED_GRADE = 30
+    
+    def __init__(self, source=''):
+        self.source = source or ''
+        self._amounts = array('q')
+        self._labels = None
+        self._first_grade = None
+        for item in self.source.split(','):
+            grade, separator, fee = item.partition(':')
+            grade, fee = grade.strip(), fee.strip()
+            if not separator or not fee.isdigit():
+                continue
+            if self._first_grade is None:
+                self._first_grade = grade
+            if grade.isdigit() and int(grade) <= self.MAX_INDEXED_GRADE:
+                index = int(grade)
+                if index >= len(self._amounts):
+                    self._amounts.extend([self.MISSING] * (index + 1 - len(self._amounts)))
+                self._amounts[index] = int(fee)
+            else:
+                if self._labels is None:
+                    self._labels = {}
+                self._labels[grade] = int(fee)
+    
+    @classmethod
+    def parse_many(cls, sources):
+        """Schedules for many fee strings, parsing each distinct string once"""
+        parsed = {}
+        schedules = []
+        for source in sources:
+            schedule = parsed.get(source)
+            if schedule is None:
+                schedule = parsed[source] = cls(source)
+            schedules.append(schedule)
+        return schedules
+    
+    def __bool__(self):
+        return self._first_grade is not None
+    
+    def get(self, grade):
+        """Fee for a grade (number or label), or None"""
+        key = str(grade).strip()
+        if key.isdigit() and int(key) < len(self._amounts):
+            amount = self._amounts[int(key)]
+            return None if amount == self.MISSING else amount
+        return self._labels.get(key) if self._labels else None
+    
+    @property
+    def default(self):
+        """Grade 12's fee, otherwise the first listed grade's; None without fees"""
+        if self._first_grade is None:
+            return None
+        fee = self.get(12)
+        # A free grade 12 (0) is a fee, not a missing one
+        return fee if fee is not None else self.get(self._first_grade)
+    
+    def items(self):
+        """(grade, amount) pairs of the numeric grades, in grade order"""
+        pairs = [(grade, amount) for grade, amount in enumerate(self._amounts) if amount != self.MISSING]
+        if self._labels:
+            pairs.extend(sorted((int(label), amount) for label, amount in self._labels.items() if label.isdigit()))
+        return pairs
+
+
+def prime_fee_schedules(schools):
+    """Attach parsed fee schedules to many schools at once, parsing each distinct fees_by_grade once"""
+    schools = list(schools)
+    for school, schedule in zip(schools, FeeSchedule.parse_many(school.fees_by_grade for school in schools)):
+        school._fee_schedule = schedule
+    return schools
+
+
+# Radii (km) SchoolQuerySet.nearest() tries in turn, stopping once it has enough
+# schools; past the last one it orders every school by distance
+NEARBY_RADII_KM = (2, 5, 10, 25, 50)
+
+# School counters of reviews with 1..5 stars, maintained by Review.save() and schools.signals
+RATING_COUNT_FIELDS = ['rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+
+
+def review_average_expression():
+    """Database expression for the mean star rating from a school's rating counters (NULL without reviews)"""
+    total = sum((models.F(field) for field in RATING_COUNT_FIELDS[1:]), models.F(RATING_COUNT_FIELDS[0]))
+    weighted = sum(
+        (stars * models.F(field) for stars, field in enumerate(RATING_COUNT_FIELDS[1:], start=2)),
+        models.F(RATING_COUNT_FIELDS[0]),
+    )
+    return models.Case(
+        models.When(**{field: 0 for field in RATING_COUNT_FIELDS}, then=models.Value(None)),
+        default=Cast(weighted, models.FloatField()) / total,
+        output_field=models.FloatField(),
+    )
+
+
+def grades_in_mask(mask):
+    """List the grades whose bits are set in a grades bitmask"""
+    return [grade for grade in range(mask.bit_length()) if mask >> grade & 1]
 
 
 class Facility(models.Model):
@@ -14,6 +148,87 @@ class Facility(models.Model):
         verbose_name_plural = "Facilities"
 
 
+class SchoolQuerySet(models.QuerySet):
+    
+    def offering_grade(self, grade):
+        """
+        Schools offering grade.
+        
+        The min/max range is served by school_grade_range_idx; the bitmask
+        test then drops schools with gaps in their grade range.
+        """
+        grade = int(grade)
+        bit = 1 << grade
+        return self.filter(min_grade__lte=grade, max_grade__gte=grade).alias(
+            grade_bit=models.F('grades_mask').bitand(bit)
+        ).filter(grade_bit=bit)
+    
+    def within_distance(self, origin, km):
+        """
+        Schools within km of origin, a (lat, lon) tuple, annotated with
+        calculated_distance.
+        
+        The radius is turned into the geohash prefixes covering it, looked up
+        as range scans on the indexed geohash column, and refined with the
+        exact Haversine distance in the database.
+        """
+        return annotate_distance(self, origin, km)
+    
+    def nearest(self, origin, count):
+        """
+        The `count` schools closest to origin, a (lat, lon) tuple, nearest
+        first and annotated with calculated_distance.
+        
+        Each try is an indexed within_distance() query over one of
+        NEARBY_RADII_KM; the radius widens until it holds `count` schools,
+        which are then the closest ones. When even the last radius holds too
+        few, every school with coordinates is ordered by its Haversine
+        distance in the database, so fewer than `count` schools are only
+        returned when fewer exist.
+        """
+        for km in NEARBY_RADII_KM:
+            schools = list(self.within_distance(origin, km).order_by('calculated_distance', 'pk')[:count])
+            if len(schools) >= count:
+                return schools
+        return list(annotate_distance(self, origin).order_by('calculated_distance', 'pk')[:count])
+    
+    def adjust_rating_counts(self, added=None, removed=None):
+        """
+        Count one review with `added` stars in, and/or one with `removed`
+        stars out, then recompute review_average; atomic updates in the
+        database, so concurrent reviews don't lose counts. updated_at is
+        touched, as the school's page changes with its reviews.
+        """
+        changes = {}
+        if removed in range(1, 6):
+            # Floored at 0, so a counter out of step with the reviews can't
+            # fail the column's CHECK and block the delete
+            changes[f'rating_{removed}'] = Greatest(models.F(f'rating_{removed}') - 1, 0)
+        if added in range(1, 6):
+            field = f'rating_{added}'
+            changes[field] = changes.get(field, models.F(field)) + 1
+        if changes:
+            self.update(**changes, updated_at=timezone.now())
+            self.update(review_average=review_average_expression())
+    
+    def rebuild_rating_counts(self):
+        """
+        Recount the rating counters and review_average of these schools from
+        their Review rows. updated_at is touched, like adjust_rating_counts()
+        does, so cached pages and fragments showing the old counts expire.
+        """
+        counts = {}
+        for stars, field in enumerate(RATING_COUNT_FIELDS, start=1):
+            reviews = Review.objects.filter(school=models.OuterRef('pk'), rating=stars)
+            counts[field] = Coalesce(
+                models.Subquery(reviews.values('school').annotate(count=models.Count('pk')).values('count')),
+                0,
+            )
+        now = timezone.now()
+        self.update(**counts, updated_at=now)
+        self.update(review_average=review_average_expression(), updated_at=now)
+
+
 class School(models.Model):
     """School model with all relevant information"""
     
@@ -31,11 +246,20 @@ class School(models.Model):
         ('C', 'Co-ed'),
     ]
     
+    # Columns recomputed by update_derived_fields()
+    DERIVED_FIELDS = [
+        'place_id', 'latitude', 'longitude', 'geohash', 'default_fee', 'grades_mask', 'min_grade', 'max_grade',
+    ]
+    
     name = models.CharField(max_length=200, db_index=True)
     location = models.CharField(max_length=200, db_index=True)
     pin_code = models.CharField(max_length=10, db_index=True)
     board = models.CharField(max_length=50, choices=BOARD_CHOICES, db_index=True)
     grades_offered = models.CharField(max_length=100, db_index=True, help_text="Comma-separated grades (e.g., '1,2,3,4,5,6,7,8,9,10,11,12')")
+    # Structured form of grades_offered, derived on save: bit g is set when grade g is offered
+    grades_mask = models.PositiveIntegerField(default=0, editable=False)
+    min_grade = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    max_grade = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
     co_ed_type = models.CharField(max_length=1, choices=CO_ED_CHOICES, default='C')
     distance = models.DecimalField(max_digits=5, decimal_places=2, db_index=True, help_text="Distance in km")
     bus_availability = models.BooleanField(default=False, db_index=True)
@@ -43,6 +267,14 @@ class School(models.Model):
     website = models.CharField(max_length=500, blank=True, help_text="School website URL")
     curriculum_website = models.CharField(max_length=500, blank=True, help_text="Curriculum website URL")
     google_maps_link = models.CharField(max_length=500, blank=True, help_text="Google Maps URL for the school location")
+    # Google place/feature ID parsed from google_maps_link on save
+    place_id = models.CharField(max_length=100, blank=True, db_index=True, editable=False)
+    # Coordinates derived on save from google_maps_link when it has them, otherwise
+    # from pin_code; used for distance search
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    # Geohash of latitude/longitude; radius queries become prefix range scans on its index
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     rating = models.DecimalField(
         max_digits=3, 
         decimal_places=1, 
@@ -58,44 +290,89 @@ class School(models.Model):
     top_review = models.TextField(blank=True, help_text="Top review from Google Maps")
     image = models.ImageField(upload_to='schools/', blank=True, null=True)
     
+    # Star histogram and mean of this school's Review rows, kept current as reviews
+    # are saved and deleted (rebuild with manage.py rebuild_review_stats)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+    review_average = models.FloatField(null=True, blank=True, editable=False)
+    
     # Fees stored as JSON-like string or separate model
     # For simplicity, storing as text field with format: "grade:fee,grade:fee"
     fees_by_grade = models.TextField(
         blank=True, 
         help_text="Format: '12:400000,11:380000' for grade 12: ₹400000, grade 11: ₹380000"
     )
+    # Denormalized from fees_by_grade on save so fee sorting/filtering can use an index;
+    # per-grade amounts live in SchoolFee
+    default_fee = models.PositiveIntegerField(null=True, blank=True, db_index=True, editable=False)
+    
+    # SHA-1 of the imported CSV content, compared by import_schools_csv --incremental
+    import_hash = models.CharField(max_length=40, blank=True, editable=False)
     
     facilities = models.ManyToManyField(Facility, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = SchoolQuerySet.as_manager()
+    
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        self.update_derived_fields()
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'fees_by_grade' in update_fields:
+            self.sync_fees()
+    
+    def update_derived_fields(self):
+        """Recompute columns derived from other fields (place, coordinates, geohash, default fee, grades)"""
+        maps = parse_google_maps_url(self.google_maps_link)
+        self.place_id = maps['place_id']
+        if maps['latitude'] is not None:
+            self.latitude, self.longitude = maps['latitude'], maps['longitude']
+        else:
+            coords = get_pincode_coordinates(self.pin_code)
+            self.latitude, self.longitude = coords if coords else (None, None)
+        self.geohash = geohash_encode(self.latitude, self.longitude) if self.latitude is not None else ''
+        self.default_fee = self.get_default_fee()
+        self.grades_mask, self.min_grade, self.max_grade = parse_grades(self.grades_offered)
+    
+    @property
+    def fee_schedule(self):
+        """
+        fees_by_grade parsed into a FeeSchedule, cached on the instance and
+        reparsed only when fees_by_grade changes.
+        """
+        schedule = getattr(self, '_fee_schedule', None)
+        if schedule is None or schedule.source != (self.fees_by_grade or ''):
+            schedule = self._fee_schedule = FeeSchedule(self.fees_by_grade)
+        return schedule
+    
+    def get_fee_rows(self):
+        """Parse fees_by_grade into SchoolFee instances (numeric grades only, unsaved)"""
+        return [SchoolFee(school=self, grade=grade, amount=amount) for grade, amount in self.fee_schedule.items()]
+    
+    def sync_fees(self):
+        """Replace this school's SchoolFee rows with the ones in fees_by_grade"""
+        SchoolFee.objects.filter(school=self).delete()
+        SchoolFee.objects.bulk_create(self.get_fee_rows())
+    
     def get_fee_for_grade(self, grade=12):
         """Get fee for a specific grade (defaults to grade 12)"""
-        if not self.fees_by_grade:
-            return None
-        fee_dict = {}
-        for item in self.fees_by_grade.split(','):
-            if ':' in item:
-                g, f = item.split(':')
-                fee_dict[g.strip()] = int(f.strip())
-        return fee_dict.get(str(grade))
+        return self.fee_schedule.get(grade)
     
     def get_default_fee(self):
         """Get default fee (preferably grade 12, otherwise first available)"""
-        if not self.fees_by_grade:
-            return None
-        fee_dict = {}
-        for item in self.fees_by_grade.split(','):
-            if ':' in item:
-                g, f = item.split(':')
-                fee_dict[g.strip()] = int(f.strip())
-        # Try grade 12 first, then any available
-        if fee_dict:
-            return fee_dict.get('12') or list(fee_dict.values())[0]
-        return None
+        return self.fee_schedule.default
+    
+    @property
+    def rating_counts(self):
+        """{stars: number of reviews} for 1..5 stars, from the rating counters"""
+        return {stars: getattr(self, field) for stars, field in enumerate(RATING_COUNT_FIELDS, start=1)}
     
     def is_valid_address_line(self, address_line):
         """Check if address line is valid (not a placeholder)"""
@@ -116,6 +393,30 @@ class School(models.Model):
     
     class Meta:
         ordering = ['-rating', 'name']
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='school_lat_lon_idx'),
+            models.Index(fields=['min_grade', 'max_grade', 'grades_mask'], name='school_grade_range_idx'),
+        ]
+
+
+class SchoolFee(models.Model):
+    """Annual fee for one grade at a school, normalized from School.fees_by_grade"""
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='fees')
+    grade = models.PositiveSmallIntegerField()
+    amount = models.PositiveIntegerField(help_text="Annual fee in ₹")
+    
+    def __str__(self):
+        return f"{self.school.name} - Grade {self.grade}: ₹{self.amount}"
+    
+    class Meta:
+        ordering = ['school', '-grade']
+        constraints = [
+            models.UniqueConstraint(fields=['school', 'grade'], name='unique_school_grade_fee'),
+        ]
+        indexes = [
+            # "grade 9 under ₹3L" is a single range scan on this index
+            models.Index(fields=['grade', 'amount'], name='school_fee_grade_amount_idx'),
+        ]
 
 
 class Review(models.Model):
@@ -133,5 +434,42 @@ class Review(models.Model):
     def __str__(self):
         return f"{self.reviewer_name} - {self.school.name} - {self.rating}★"
     
+    def save(self, *args, **kwargs):
+        # The school's rating counters change in the same transaction as the review;
+        # deletions are counted out by the post_delete handler in schools.signals
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = Review.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'school_id', 'rating'
+                ).first()
+            super().save(*args, **kwargs)
+            if previous == (self.school_id, self.rating):
+                # Same counters, but the school's page (and its ETag) still changes
+                School.objects.filter(pk=self.school_id).update(updated_at=timezone.now())
+                return
+            if previous is None:
+                School.objects.filter(pk=self.school_id).adjust_rating_counts(added=self.rating)
+            elif previous[0] == self.school_id:
+                School.objects.filter(pk=self.school_id).adjust_rating_counts(added=self.rating, removed=previous[1])
+            else:
+                School.objects.filter(pk=previous[0]).adjust_rating_counts(removed=previous[1])
+                School.objects.filter(pk=self.school_id).adjust_rating_counts(added=self.rating)
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A school's review feed pages through this index newest first
+            models.Index(fields=['school', '-created_at', '-id'], name='review_school_created_idx'),
+        ]
+
+
+class DatasetVersion(models.Model):
+    """
+    Single-row counter of changes to the school data, shared by every worker
+    process and management command (see schools.caching).
+    """
+    version = models.BigIntegerField()
+    
+    def __str__(self):
+        return f"Dataset version {self.version}"
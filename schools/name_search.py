@@ -0,0 +1,300 @@
+"""In-memory name search engine: tokenized inverted index with prefix and fuzzy matching"""
+import bisect
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from .caching import get_dataset_version
+from .models import School
+
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Common abbreviations in Indian school names, expanded at index and query time
+ABBREVIATIONS = {
+    'sr': 'senior',
+    'sec': 'secondary',
+    'secy': 'secondary',
+    'hr': 'higher',
+    'hsc': 'higher secondary',
+    'matric': 'matriculation',
+    'intl': 'international',
+    'int': 'international',
+    'sch': 'school',
+    'vid': 'vidyalaya',
+    'kv': 'kendriya vidyalaya',
+    'pub': 'public',
+    'govt': 'government',
+}
+
+# Field weights: a hit in the name counts more than a hit in the location
+NAME_WEIGHT = 1.0
+LOCATION_WEIGHT = 0.4
+
+# Match-quality weights per query token
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.75
+FUZZY_SCORE = 0.6
+
+# Minimum trigram similarity for a token to be considered a fuzzy candidate
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+
+def normalize(text):
+    """Lowercase text and strip accents (e.g. 'Árbol' -> 'arbol')"""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    """
+    Split text into normalized tokens, expanding known abbreviations.
+    
+    Runs of single letters ("D A V", "D.A.V.") also yield the joined acronym
+    ("dav") so both spellings find each other.
+    """
+    tokens = []
+    letters = []
+    for token in TOKEN_RE.findall(normalize(text)):
+        if len(token) == 1 and token.isalpha():
+            letters.append(token)
+        else:
+            if len(letters) > 1:
+                tokens.append(''.join(letters))
+            letters = []
+        tokens.extend(ABBREVIATIONS.get(token, token).split())
+    if len(letters) > 1:
+        tokens.append(''.join(letters))
+    return tokens
+
+
+def trigrams(token):
+    """Character trigrams of a token, padded so short tokens still have some"""
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def max_edits(token):
+    """How many typos to tolerate for a query token of this length"""
+    if len(token) <= 3:
+        return 0
+    if len(token) <= 6:
+        return 1
+    return 2
+
+
+class NameSearchIndex:
+    """
+    Per-process search engine over School names and locations.
+
+    Keeps an inverted index (token -> {school_id: field weight}), a sorted
+    token list for prefix lookups and a trigram index over tokens for fuzzy
+    matching. Every query token must match a school through an exact, prefix
+    or fuzzy hit; schools are ranked by the summed match quality.
+
+    Built lazily from the School table and updated per school by the signal
+    handlers in schools.signals; rebuilt when the dataset version moves on
+    without this process having patched the change.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._dataset_version = None
+        self._reset()
+
+    def _reset(self):
+        self._postings = defaultdict(dict)    # token -> {school_id: weight}
+        self._tokens = []                     # sorted list of indexed tokens
+        self._trigrams = defaultdict(set)     # trigram -> tokens
+        self._documents = {}                  # school_id -> (tokens, normalized name)
+
+    # Building and patching
+
+    def build(self):
+        """(Re)build the index from the School table"""
+        with self._lock:
+            self._reset()
+            self._dataset_version = get_dataset_version()
+            rows = School.objects.values_list('id', 'name', 'location').order_by('pk')
+            for school_id, name, location in rows.iterator(chunk_size=2000):
+                self._add(school_id, name, location, sort=False)
+            self._tokens.sort()
+            self._built = True
+
+    def ensure_built(self):
+        """Build the index if it is missing or older than the dataset version"""
+        if not self._built or self._dataset_version != get_dataset_version():
+            self.build()
+
+    def follow_version(self, previous, current):
+        """Adopt a new dataset version after patching the change in place"""
+        with self._lock:
+            if self._dataset_version == previous:
+                self._dataset_version = current
+
+    def invalidate(self):
+        """Drop the index; it is rebuilt on next use"""
+        with self._lock:
+            self._built = False
+            self._reset()
+
+    def update(self, school):
+        """Re-index a single school"""
+        with self._lock:
+            if not self._built:
+                return
+            self._remove(school.pk)
+            self._add(school.pk, school.name, school.location)
+
+    def remove(self, school_id):
+        """Remove a single school"""
+        with self._lock:
+            if self._built:
+                self._remove(school_id)
+
+    def _add(self, school_id, name, location, sort=True):
+        weights = {}
+        for token in tokenize(location):
+            weights[token] = LOCATION_WEIGHT
+        for token in tokenize(name):
+            weights[token] = NAME_WEIGHT
+
+        for token, weight in weights.items():
+            if token not in self._postings:
+                if sort:
+                    bisect.insort(self._tokens, token)
+                else:
+                    self._tokens.append(token)
+                for gram in trigrams(token):
+                    self._trigrams[gram].add(token)
+            self._postings[token][school_id] = weight
+
+        self._documents[school_id] = (tuple(weights), ' '.join(tokenize(name)))
+
+    def _remove(self, school_id):
+        document = self._documents.pop(school_id, None)
+        if document is None:
+            return
+        for token in document[0]:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(school_id, None)
+            if not postings:
+                del self._postings[token]
+                position = bisect.bisect_left(self._tokens, token)
+                if position < len(self._tokens) and self._tokens[position] == token:
+                    del self._tokens[position]
+                for gram in trigrams(token):
+                    self._trigrams[gram].discard(token)
+
+    # Querying
+
+    def _prefix_tokens(self, prefix):
+        start = bisect.bisect_left(self._tokens, prefix)
+        end = bisect.bisect_left(self._tokens, prefix + '\uffff')
+        return self._tokens[start:end]
+
+    def _fuzzy_tokens(self, token):
+        """Indexed tokens within max_edits(token) of token, with their similarity"""
+        limit = max_edits(token)
+        if not limit:
+            return {}
+        query_grams = trigrams(token)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for candidate in self._trigrams.get(gram, ()):
+                shared[candidate] += 1
+
+        matches = {}
+        for candidate, count in shared.items():
+            similarity = count / len(query_grams | trigrams(candidate))
+            if similarity < MIN_TRIGRAM_SIMILARITY:
+                continue
+            distance = edit_distance(token, candidate, limit)
+            if distance <= limit:
+                matches[candidate] = 1 - distance / (len(token) + 1)
+        return matches
+
+    def _match_token(self, token, is_last):
+        """Score every school matching one query token: {school_id: score}"""
+        scores = {}
+
+        def credit(candidate, quality):
+            for school_id, weight in self._postings.get(candidate, {}).items():
+                score = quality * weight
+                if score > scores.get(school_id, 0):
+                    scores[school_id] = score
+
+        credit(token, EXACT_SCORE)
+        # Every token may be a prefix ("Kend" -> "kendriya"); the last one most often is
+        for candidate in self._prefix_tokens(token):
+            if candidate != token:
+                coverage = len(token) / len(candidate)
+                credit(candidate, PREFIX_SCORE * (0.5 + 0.5 * coverage) * (1 if is_last else 0.9))
+        if not scores:
+            for candidate, similarity in self._fuzzy_tokens(token).items():
+                credit(candidate, FUZZY_SCORE * similarity)
+        return scores
+
+    def search(self, query, limit=None):
+        """
+        Return [(school_id, score), ...] for schools matching query, best first.
+
+        All query tokens have to match (exactly, as a prefix or fuzzily).
+        A name that starts with the query gets an extra boost.
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+
+        with self._lock:
+            self.ensure_built()
+            totals = None
+            for i, token in enumerate(query_tokens):
+                scores = self._match_token(token, is_last=i == len(query_tokens) - 1)
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {
+                        school_id: total + scores[school_id]
+                        for school_id, total in totals.items()
+                        if school_id in scores
+                    }
+                if not totals:
+                    return []
+
+            phrase = ' '.join(query_tokens)
+            results = []
+            for school_id, total in totals.items():
+                score = total / len(query_tokens)
+                if self._documents[school_id][1].startswith(phrase):
+                    score += 0.5
+                results.append((school_id, round(score, 4)))
+
+        results.sort(key=lambda item: -item[1])
+        return results[:limit] if limit else results
+
+
+name_index = NameSearchIndex()
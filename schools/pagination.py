@@ -0,0 +1,48 @@
+"""Keyset (cursor) pagination helpers for search results and review feeds"""
+import base64
+import binascii
+import json
+
+
+# Results per page when the request doesn't ask for a size
+DEFAULT_PAGE_SIZE = 24
+
+# Hard cap on the page size a client can request
+MAX_PAGE_SIZE = 100
+
+# Reviews per page of a school's review feed
+REVIEW_PAGE_SIZE = 10
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse a page_size parameter, clamped to [1, maximum]"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def encode_cursor(sort, key):
+    """Encode the sort order and the last row's sort key as an opaque URL-safe token"""
+    payload = json.dumps([sort, list(key)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Returns the sort key tuple, or None if the token is missing, malformed or
+    was issued for a different sort order (the caller then starts from the top).
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_sort, key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, binascii.Error, UnicodeError):
+        return None
+    if cursor_sort != sort or not isinstance(key, list):
+        return None
+    return tuple(key)
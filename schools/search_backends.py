@@ -0,0 +1,184 @@
+"""
+Full-text search backends for school names.
+
+get_search_backend() picks the engine matching DATABASES['default']['ENGINE']:
+
+- PostgreSQL (Supabase): a GIN-indexed tsvector over name, location, syllabus
+  and top_review, with a pg_trgm similarity fallback for misspellings.
+- SQLite: an FTS5 virtual table kept in sync with schools_school by triggers,
+  with the in-memory engine from schools.name_search as the fuzzy fallback.
+- Anything else: the in-memory engine alone.
+
+Every backend returns [(school_id, score), ...] ordered best first: every
+match by default, so result and facet counts built on them stay exact, or
+the best `limit` ones when a limit is given.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+
+from .name_search import name_index
+
+
+QUERY_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_FTS_TABLE = 'schools_school_fts'
+
+# Searched columns; for Postgres their weights are A > B > C > D in this order
+SEARCH_COLUMNS = ('name', 'location', 'syllabus', 'top_review')
+
+# Must stay identical to the indexed expression so PostgreSQL uses the GIN index
+POSTGRES_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple'::regconfig, coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(location, '')), 'B') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(syllabus, '')), 'C') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(top_review, '')), 'D')"
+)
+
+
+def query_tokens(query):
+    """Lowercased word tokens of a search query, safe to embed in FTS syntax"""
+    return QUERY_TOKEN_RE.findall(str(query or '').lower())
+
+
+def install_sqlite_fts(cursor):
+    """Create the FTS5 table and its sync triggers (idempotent)"""
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+
+    created = not sqlite_fts_installed(cursor)
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5("
+        f"{columns}, content='schools_school', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ai AFTER INSERT ON schools_school BEGIN "
+        f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ad AFTER DELETE ON schools_school BEGIN "
+        f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values}); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_au AFTER UPDATE ON schools_school BEGIN "
+        f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    )
+    if created:
+        cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
+
+
+def sqlite_fts_installed(cursor):
+    cursor.execute(
+        f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{SQLITE_FTS_TABLE}'"
+    )
+    return cursor.fetchone() is not None
+
+
+def uninstall_sqlite_fts(cursor):
+    for suffix in ('ai', 'ad', 'au'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_{suffix}")
+    cursor.execute(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}")
+
+
+def install_postgres_search(cursor):
+    """Create the tsvector and trigram GIN indexes (idempotent)"""
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS school_search_vector_idx ON schools_school "
+        f"USING GIN (({POSTGRES_SEARCH_VECTOR}))"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS school_name_trgm_idx ON schools_school "
+        "USING GIN (name gin_trgm_ops)"
+    )
+
+
+def uninstall_postgres_search(cursor):
+    cursor.execute("DROP INDEX IF EXISTS school_search_vector_idx")
+    cursor.execute("DROP INDEX IF EXISTS school_name_trgm_idx")
+
+
+class InMemorySearchBackend:
+    """Prefix and typo-tolerant matching from schools.name_search"""
+
+    def search(self, query, limit=None):
+        return name_index.search(query, limit)
+
+
+class SQLiteFTSBackend:
+    """FTS5 prefix search ranked by bm25, falling back to the fuzzy in-memory engine"""
+
+    # bm25 column weights, in SEARCH_COLUMNS order
+    WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+    def __init__(self):
+        self.fallback = InMemorySearchBackend()
+
+    def search(self, query, limit=None):
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(weight) for weight in self.WEIGHTS)
+        with connection.cursor() as cursor:
+            # A negative LIMIT means no limit in SQLite
+            cursor.execute(
+                f"SELECT rowid, bm25({SQLITE_FTS_TABLE}, {weights}) AS score "
+                f"FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s "
+                f"ORDER BY score LIMIT %s",
+                [match, -1 if limit is None else limit],
+            )
+            # bm25 is lower-is-better; flip it so higher scores rank first
+            results = [(school_id, -score) for school_id, score in cursor.fetchall()]
+        return results or self.fallback.search(query, limit)
+
+
+class PostgresSearchBackend:
+    """GIN-indexed tsvector prefix search, with pg_trgm similarity for misspellings"""
+
+    def search(self, query, limit=None):
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        with connection.cursor() as cursor:
+            # LIMIT NULL (limit=None) means no limit in PostgreSQL
+            cursor.execute(
+                f"SELECT id, ts_rank({POSTGRES_SEARCH_VECTOR}, to_tsquery('simple', %s)) AS rank "
+                f"FROM schools_school "
+                f"WHERE {POSTGRES_SEARCH_VECTOR} @@ to_tsquery('simple', %s) "
+                f"ORDER BY rank DESC, id LIMIT %s",
+                [tsquery, tsquery, limit],
+            )
+            results = cursor.fetchall()
+            if results:
+                return results
+
+            cursor.execute(
+                "SELECT id, similarity(name, %s) AS rank FROM schools_school "
+                "WHERE name %% %s "
+                "ORDER BY rank DESC, id LIMIT %s",
+                [query, query, limit],
+            )
+            return cursor.fetchall()
+
+
+@lru_cache(maxsize=None)
+def _backend_for_engine(engine):
+    if 'postgresql' in engine or 'postgis' in engine:
+        return PostgresSearchBackend()
+    if 'sqlite3' in engine:
+        return SQLiteFTSBackend()
+    return InMemorySearchBackend()
+
+
+def get_search_backend():
+    """Search backend for the active database engine"""
+    return _backend_for_engine(settings.DATABASES['default']['ENGINE'])
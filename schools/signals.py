@@ -0,0 +1,141 @@
+"""Signal handlers keeping the in-process search structures in sync with the database"""
+from django.db import connections, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .bitmap_index import school_index
+from .caching import bump_dataset_version, invalidate_school_pages
+from .distances import school_coordinates
+from .models import Facility, Review, School
+from .name_search import name_index
+from .search_backends import install_sqlite_fts, sqlite_fts_installed
+
+
+def dataset_changed(patch=None):
+    """
+    Once the current transaction commits, bump the dataset version and apply
+    patch to this process's indexes, which then adopt the new version
+    instead of rebuilding.
+    """
+    def on_commit():
+        previous, current = bump_dataset_version()
+        if patch is not None:
+            patch()
+        school_index.follow_version(previous, current)
+        name_index.follow_version(previous, current)
+        school_coordinates.follow_version(previous, current)
+    transaction.on_commit(on_commit)
+
+
+def touch_schools(school_ids):
+    """
+    Bump updated_at of schools whose pages changed without a School save
+    (facility links and names), and drop their cached pages.
+    """
+    school_ids = list(school_ids)
+    School.objects.filter(pk__in=school_ids).update(updated_at=timezone.now())
+    invalidate_school_pages(school_ids)
+
+
+@receiver(post_save, sender=School)
+def school_saved(sender, instance, **kwargs):
+    """Patch the bitmap and name indexes and coordinates once the save is committed"""
+    def patch():
+        school_index.update(instance)
+        name_index.update(instance)
+        school_coordinates.update(instance)
+    dataset_changed(patch)
+    invalidate_school_pages([instance.pk])
+
+
+@receiver(post_delete, sender=School)
+def school_deleted(sender, instance, **kwargs):
+    """Drop a deleted school from the bitmap and name indexes and coordinates"""
+    school_id = instance.pk
+    def patch():
+        school_index.remove(school_id)
+        name_index.remove(school_id)
+        school_coordinates.remove(school_id)
+    dataset_changed(patch)
+    invalidate_school_pages([school_id])
+
+
+@receiver(m2m_changed, sender=School.facilities.through)
+def school_facilities_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Refresh facility bitsets and school pages when facilities are added to or removed from schools"""
+    if action == 'pre_clear':
+        # The cleared links are only known before they go
+        touch_schools(instance.school_set.values_list('pk', flat=True) if reverse else [instance.pk])
+        return
+    if action in ('post_add', 'post_remove'):
+        touch_schools(pk_set if reverse else [instance.pk])
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # instance is a Facility; the affected schools are in pk_set (or unknown on clear)
+        dataset_changed(school_index.invalidate)
+    else:
+        dataset_changed(lambda: school_index.update(instance))
+
+
+@receiver(post_save, sender=Facility)
+def facility_saved(sender, instance, **kwargs):
+    """Facility names and icons appear in search results and school pages"""
+    touch_schools(instance.school_set.values_list('pk', flat=True))
+    dataset_changed()
+
+
+@receiver(pre_delete, sender=Facility)
+def facility_deleting(sender, instance, **kwargs):
+    """The schools losing a deleted facility are only known before its links go"""
+    touch_schools(instance.school_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Facility)
+def facility_deleted(sender, instance, **kwargs):
+    """Deleting a facility removes its links without an m2m_changed signal"""
+    dataset_changed(school_index.invalidate)
+
+
+def deleting_schools(origin):
+    """Whether a delete started from School rows, so their reviews go with them"""
+    return isinstance(origin, School) or (isinstance(origin, QuerySet) and origin.model is School)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, **kwargs):
+    """
+    Reviews only feed their school's page (Review.save() has already
+    updated its counters and updated_at). Search results, facets and the
+    indexes read School columns alone, so the dataset version stays put.
+    """
+    invalidate_school_pages([instance.school_id])
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, origin=None, **kwargs):
+    """
+    Count a deleted review out of its school's rating counters; post_delete
+    is sent inside the deletion's transaction, queryset deletes included.
+    Reviews cascading from a deleted school are left to school_deleted.
+    Like saves, deletes don't move the dataset version.
+    """
+    if deleting_schools(origin):
+        return
+    School.objects.filter(pk=instance.school_id).adjust_rating_counts(removed=instance.rating)
+    invalidate_school_pages([instance.school_id])
+
+
+def restore_sqlite_fts_triggers(sender, using='default', **kwargs):
+    """
+    SQLite migrations that rebuild schools_school drop its triggers; recreate
+    the FTS sync triggers once migrations have run.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if sqlite_fts_installed(cursor):
+            install_sqlite_fts(cursor)
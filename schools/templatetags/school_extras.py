@@ -13,11 +13,10 @@ def get_item(dictionary, key):
 
 @register.filter
 def get_fee(school, grade):
-    """Get fee for a specific grade"""
+    """Get fee for a specific grade, from the school's parsed fee schedule"""
     try:
-        grade_int = int(grade)
-        return school.get_fee_for_grade(grade_int)
-    except (ValueError, AttributeError):
+        return school.fee_schedule.get(int(grade))
+    except (ValueError, TypeError, AttributeError):
         return None
 
 
@@ -1,3 +1,905 @@
-from django.test import TestCase
+import json
+import math
+import os
+import random
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.core.management import call_command
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import caching
+from .bitmap_index import school_index
+from .caching import get_dataset_version
+from .distances import school_coordinates
+from .fragments import fragment_key, render_fragments
+from .gazetteer import PincodeGazetteer, write_gazetteer
+from .maps_links import parse_google_maps_url
+from .models import Facility, FeeSchedule, Review, School, prime_fee_schedules
+from .name_search import name_index
+from .pagination import encode_cursor
+from .search_backends import InMemorySearchBackend, SQLiteFTSBackend
+from .typeahead import PrefixArray, typeahead_index
+from .utils import geohash_cover, geohash_encode, get_pincode_coordinates, haversine_distance
+from .views import NEARBY_SCHOOLS_COUNT
+
+
+def make_school(**fields):
+    """Save a school with placeholder values for the required columns"""
+    values = {
+        'name': 'Test School',
+        'location': 'Adyar, Chennai',
+        'pin_code': '600020',
+        'board': 'CBSE',
+        'grades_offered': '1,2,3,4,5',
+        'distance': 0,
+        'syllabus': 'CBSE',
+        'rating': 4.0,
+    }
+    values.update(fields)
+    return School.objects.create(**values)
+
+
+class RatingCounterTests(TestCase):
+    """School.rating_N and review_average follow review saves and deletes"""
+
+    def setUp(self):
+        self.school = make_school()
+
+    def counts(self, school=None):
+        school = School.objects.get(pk=(school or self.school).pk)
+        return school.rating_counts, school.review_average
+
+    def test_create(self):
+        Review.objects.create(school=self.school, rating=5, reviewer_name='A')
+        Review.objects.create(school=self.school, rating=2, reviewer_name='B')
+        self.assertEqual(self.counts(), ({1: 0, 2: 1, 3: 0, 4: 0, 5: 1}, 3.5))
+
+    def test_edit_rating(self):
+        review = Review.objects.create(school=self.school, rating=5, reviewer_name='A')
+        review.rating = 1
+        review.save()
+        self.assertEqual(self.counts(), ({1: 1, 2: 0, 3: 0, 4: 0, 5: 0}, 1.0))
+
+    def test_move_to_other_school(self):
+        other = make_school(name='Other School')
+        review = Review.objects.create(school=self.school, rating=4, reviewer_name='A')
+        review.school = other
+        review.save()
+        self.assertEqual(self.counts(), ({1: 0, 2: 0, 3: 0, 4: 0, 5: 0}, None))
+        self.assertEqual(self.counts(other), ({1: 0, 2: 0, 3: 0, 4: 1, 5: 0}, 4.0))
+
+    def test_delete(self):
+        Review.objects.create(school=self.school, rating=3, reviewer_name='A')
+        review = Review.objects.create(school=self.school, rating=5, reviewer_name='B')
+        review.delete()
+        self.assertEqual(self.counts(), ({1: 0, 2: 0, 3: 1, 4: 0, 5: 0}, 3.0))
+        Review.objects.filter(school=self.school).delete()
+        self.assertEqual(self.counts(), ({1: 0, 2: 0, 3: 0, 4: 0, 5: 0}, None))
+
+    def test_delete_with_counters_out_of_sync(self):
+        # bulk_create skips save(), leaving the counters at 0
+        Review.objects.bulk_create([Review(school=self.school, rating=4, reviewer_name='A')])
+        Review.objects.filter(school=self.school).delete()
+        self.assertEqual(self.counts()[0][4], 0)
+
+    def test_rebuild(self):
+        Review.objects.bulk_create([
+            Review(school=self.school, rating=rating, reviewer_name='A') for rating in (1, 1, 4)
+        ])
+        School.objects.filter(pk=self.school.pk).rebuild_rating_counts()
+        self.assertEqual(self.counts(), ({1: 2, 2: 0, 3: 0, 4: 1, 5: 0}, 2.0))
+
+    def test_school_delete_skips_review_counters(self):
+        Review.objects.bulk_create([
+            Review(school=self.school, rating=rating, reviewer_name='A') for rating in (1, 2, 3, 4, 5)
+        ])
+        with self.assertNumQueries(6):
+            # Collect the school and its reviews, delete links, fees, reviews and the school; no counter updates
+            School.objects.filter(pk=self.school.pk).delete()
+        self.assertFalse(Review.objects.exists())
+
+
+class ReviewFeedTests(TestCase):
+    """A school's review feed pages newest first through keyset cursors"""
+
+    def setUp(self):
+        self.school = make_school()
+        other = make_school(name='Other School')
+        Review.objects.bulk_create(
+            [Review(school=self.school, rating=3, reviewer_name=f'R{number}') for number in range(20)]
+            + [Review(school=other, rating=3, reviewer_name='Elsewhere')]
+        )
+        # Pairs of reviews share a timestamp, so pages have to break ties on the id
+        base = timezone.now()
+        for number, review in enumerate(Review.objects.filter(school=self.school).order_by('pk')):
+            Review.objects.filter(pk=review.pk).update(created_at=base + timedelta(minutes=number // 2))
+        self.url = reverse('school_reviews', args=[self.school.pk])
+
+    def walk(self, page_size):
+        pages, cursor = [], ''
+        while True:
+            response = self.client.get(self.url, {'page_size': page_size, 'cursor': cursor})
+            pages.append([review.pk for review in response.context['reviews']])
+            cursor = response['X-Next-Cursor']
+            if not cursor:
+                return pages
+
+    def test_pages_newest_first(self):
+        expected = list(
+            Review.objects.filter(school=self.school).order_by('-created_at', '-pk').values_list('pk', flat=True)
+        )
+        pages = self.walk(7)
+        self.assertEqual([len(page) for page in pages], [7, 7, 6])
+        self.assertEqual([pk for page in pages for pk in page], expected)
+
+    def test_last_full_page_has_no_cursor(self):
+        # 20 reviews in pages of 10: the second page is the last, with no empty third page
+        self.assertEqual([len(page) for page in self.walk(10)], [10, 10])
+
+    def test_bad_cursor_starts_from_the_top(self):
+        def first_page(cursor):
+            response = self.client.get(self.url, {'page_size': 5, 'cursor': cursor})
+            return [review.pk for review in response.context['reviews']]
+
+        for cursor in ('garbage', encode_cursor('rating', (-4.0, 'A', 1)), encode_cursor('reviews', ('soon', 1))):
+            self.assertEqual(first_page(cursor), first_page(''), cursor)
+
+    def test_unknown_school(self):
+        self.assertEqual(self.client.get(reverse('school_reviews', args=[0])).status_code, 404)
+
+
+class DatasetVersionTests(TestCase):
+    """Only changes that can alter search results move the dataset version"""
+
+    def setUp(self):
+        self.school = make_school()
+        self.forget_version()
+
+    def forget_version(self):
+        # The per-process memo outlives each test's rolled-back transaction
+        caching._last_version = (None, 0.0)
+
+    def version_after(self, change):
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.forget_version()
+        return get_dataset_version()
+
+    def test_reviews_keep_the_version(self):
+        version = get_dataset_version()
+        review = Review(school=self.school, rating=5, reviewer_name='A')
+        self.assertEqual(self.version_after(review.save), version)
+        review.rating = 2
+        self.assertEqual(self.version_after(review.save), version)
+        self.assertEqual(self.version_after(review.delete), version)
+        # The counters still follow
+        self.assertEqual(School.objects.get(pk=self.school.pk).rating_counts[2], 0)
+
+    def test_school_save_bumps_the_version(self):
+        version = get_dataset_version()
+        self.school.rating = 2.5
+        self.assertGreater(self.version_after(self.school.save), version)
+
+
+class SchoolDetailCachingTests(TestCase):
+    """Detail page validators change whenever the rendered page would"""
+
+    def setUp(self):
+        self.school = make_school()
+        self.review = Review.objects.create(school=self.school, rating=4, reviewer_name='A', comment='Good')
+        self.url = reverse('school_detail', args=[self.school.pk])
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_review_comment_edit_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.review.comment = 'Much better now'
+        self.review.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Much better now')
+
+    def test_rebuild_review_stats_changes_etag(self):
+        # bulk_create skips the counters; the page only shows the review once they are rebuilt
+        Review.objects.bulk_create([Review(school=self.school, rating=1, reviewer_name='B')])
+        etag = self.client.get(self.url)['ETag']
+        call_command('rebuild_review_stats', stdout=StringIO())
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['rating_distribution'][1], 1)
+
+    def test_refresh_school_fields_changes_etag(self):
+        # Queryset updates skip the derived columns until refresh_school_fields recomputes them
+        School.objects.filter(pk=self.school.pk).update(fees_by_grade='5:42000')
+        etag = self.client.get(self.url)['ETag']
+        call_command('refresh_school_fields', stdout=StringIO())
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['school'].default_fee, 42000)
+
+    def test_review_delete_changes_etag(self):
+        Review.objects.create(school=self.school, rating=2, reviewer_name='B', comment='Too far away')
+        etag = self.client.get(self.url)['ETag']
+        self.review.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Good')
+
+
+class SchoolImportTests(TestCase):
+    """import_schools_csv replaces the catalogue, and --incremental only writes what changed"""
+
+    csv_file = str(settings.BASE_DIR / 'Schools.csv')
+
+    def import_csv(self, *args):
+        out = StringIO()
+        call_command('import_schools_csv', self.csv_file, '--workers', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_full_import_replaces_schools_and_reviews(self):
+        school = make_school(name='Closed School')
+        school.facilities.add(Facility.objects.create(name='Library'))
+        Review.objects.create(school=school, rating=5, reviewer_name='A')
+        self.import_csv()
+        self.assertFalse(School.objects.filter(name='Closed School').exists())
+        self.assertFalse(Review.objects.exists())
+        self.assertFalse(School.facilities.through.objects.exists())
+        self.assertTrue(School.objects.exists())
+
+    def test_unchanged_file(self):
+        self.import_csv()
+        ids = set(School.objects.values_list('pk', flat=True))
+        output = self.import_csv('--incremental')
+        self.assertIn('0 created, 0 updated, 0 deleted', output)
+        self.assertEqual(set(School.objects.values_list('pk', flat=True)), ids)
+
+    def test_keeps_reviews_of_unchanged_schools(self):
+        self.import_csv()
+        school = School.objects.order_by('pk').first()
+        Review.objects.create(school=school, rating=5, reviewer_name='A')
+        self.import_csv('--incremental')
+        self.assertTrue(Review.objects.filter(school=school).exists())
+
+
+class RadiusQueryTests(TestCase):
+    """Geohash and grid-index radius and nearest queries agree with plain Haversine"""
+
+    origin = (13.0418, 80.2341)
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        cls.points = {}
+        for number in range(300):
+            school = make_school(name=f'School {number}')
+            lat = cls.origin[0] + rng.uniform(-0.4, 0.4)
+            lon = cls.origin[1] + rng.uniform(-0.4, 0.4)
+            School.objects.filter(pk=school.pk).update(
+                latitude=lat, longitude=lon, geohash=geohash_encode(lat, lon)
+            )
+            cls.points[school.pk] = (lat, lon)
+
+    def setUp(self):
+        # The grid index is per process; rebuild it from this test's rows
+        school_coordinates.invalidate()
+
+    def distances(self):
+        return {
+            pk: haversine_distance(*self.origin, lat, lon) for pk, (lat, lon) in self.points.items()
+        }
+
+    def test_within_distance(self):
+        for km in (0.5, 3, 10, 25, 80):
+            expected = {pk for pk, d in self.distances().items() if d <= km}
+            found = School.objects.within_distance(self.origin, km)
+            self.assertEqual(set(found.values_list('pk', flat=True)), expected, km)
+
+    def test_calculated_distance(self):
+        distances = self.distances()
+        for pk, km in School.objects.within_distance(self.origin, 10).values_list('pk', 'calculated_distance'):
+            self.assertAlmostEqual(km, distances[pk], places=6)
+
+    def test_nearest(self):
+        expected = sorted(self.distances().items(), key=lambda item: (item[1], item[0]))[:5]
+        found = School.objects.nearest(self.origin, 5)
+        self.assertEqual([school.pk for school in found], [pk for pk, d in expected])
+
+    def test_nearest_beyond_the_last_radius(self):
+        far = make_school(name='Far School')
+        # New Delhi, well past the last of NEARBY_RADII_KM
+        School.objects.filter(pk=far.pk).update(
+            latitude=28.61, longitude=77.21, geohash=geohash_encode(28.61, 77.21)
+        )
+        found = School.objects.nearest(self.origin, len(self.points) + 5)
+        self.assertEqual(len(found), len(self.points) + 1)
+        self.assertEqual(found[-1].pk, far.pk)
+
+    def test_grid_within(self):
+        for km in (0.5, 3, 10, 25, 80):
+            expected = {pk for pk, d in self.distances().items() if d <= km}
+            self.assertEqual(set(school_coordinates.within(self.origin, km)), expected, km)
+
+    def test_grid_nearest(self):
+        ranked = sorted(self.distances().items(), key=lambda item: (item[1], item[0]))
+        skipped = ranked[0][0]
+        found = school_coordinates.nearest(self.origin, 5, exclude={skipped})
+        self.assertEqual([pk for pk, km in found], [pk for pk, d in ranked[1:6]])
+
+    def test_nearby_schools_from_either_index(self):
+        school = School.objects.get(pk=min(self.points))
+        url = reverse('school_detail', args=[school.pk])
+        cache.clear()
+        from_geohash = [nearby.pk for nearby in self.client.get(url).context['nearby_schools']]
+        school_coordinates.ensure_built()
+        cache.clear()
+        from_grid = [nearby.pk for nearby in self.client.get(url).context['nearby_schools']]
+        self.assertEqual(len(from_geohash), NEARBY_SCHOOLS_COUNT)
+        self.assertEqual(from_grid, from_geohash)
+
+    def test_invalid_radius(self):
+        for km in (math.nan, math.inf, -1):
+            with self.assertRaises(ValueError):
+                geohash_cover(*self.origin, km)
+
+    def test_invalid_distance_max_is_ignored(self):
+        cache.clear()
+        school_index.invalidate()
+        url = reverse('school_search_results')
+        for value in ('nan', 'inf', '-inf', '-5'):
+            response = self.client.get(url, {'distance_max': value, 'user_pin_code': '600020'})
+            self.assertEqual(response.status_code, 200, value)
+            self.assertEqual(response.context['schools_count'], len(self.points), value)
+
+
+class VectorizedDistanceTests(TestCase):
+    """school_coordinates.distances() matches per-school Haversine, with and without NumPy"""
+
+    origin = (13.0418, 80.2341)
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(11)
+        cls.points = {}
+        for number in range(60):
+            school = make_school(name=f'School {number}')
+            lat, lon = cls.origin[0] + rng.uniform(-0.3, 0.3), cls.origin[1] + rng.uniform(-0.3, 0.3)
+            School.objects.filter(pk=school.pk).update(latitude=lat, longitude=lon)
+            cls.points[school.pk] = (lat, lon)
+        # A school that can't be geocoded never gets a distance
+        unlocated = make_school(name='No Coordinates School')
+        School.objects.filter(pk=unlocated.pk).update(latitude=None, longitude=None)
+
+    def setUp(self):
+        school_coordinates.invalidate()
+
+    def expected(self, km=None):
+        distances = {
+            pk: haversine_distance(*self.origin, lat, lon) for pk, (lat, lon) in self.points.items()
+        }
+        return {pk: d for pk, d in distances.items() if km is None or d <= km}
+
+    def assertDistances(self, found, expected):
+        self.assertEqual(set(found), set(expected))
+        for pk, km in found.items():
+            self.assertAlmostEqual(km, expected[pk], places=6)
+
+    def test_distances(self):
+        self.assertDistances(school_coordinates.distances(self.origin), self.expected())
+        self.assertDistances(school_coordinates.distances(self.origin, 10), self.expected(10))
+
+    def test_without_numpy(self):
+        with mock.patch('schools.distances.NUMPY_AVAILABLE', False), \
+                mock.patch('schools.utils.NUMPY_AVAILABLE', False):
+            school_coordinates.invalidate()
+            self.assertDistances(school_coordinates.distances(self.origin, 10), self.expected(10))
+        school_coordinates.invalidate()
+
+    def test_removed_school(self):
+        removed = min(self.points)
+        school_coordinates.ensure_built()
+        school_coordinates.remove(removed)
+        self.assertNotIn(removed, school_coordinates.distances(self.origin))
+
+    def test_default_radius_takes_the_vectorized_pass(self):
+        with mock.patch.object(school_coordinates, 'distances', wraps=school_coordinates.distances) as distances:
+            found = school_coordinates.within(self.origin, 50)
+            self.assertEqual(distances.call_count, 1)
+            # A radius well inside one city only reads the grid cells around it
+            school_coordinates.within(self.origin, 1)
+            self.assertEqual(distances.call_count, 1)
+        self.assertDistances(found, self.expected(50))
+
+    def test_search_results_sorted_by_distance(self):
+        cache.clear()
+        school_index.invalidate()
+        with mock.patch('schools.views.get_pincode_coordinates', return_value=self.origin):
+            response = self.client.get(
+                reverse('school_search_api'), {'user_pin_code': '600020', 'sort': 'distance', 'fields': 'id'}
+            )
+        ids = [row['id'] for row in json.loads(b''.join(response.streaming_content))['results']]
+        expected = self.expected(50)
+        self.assertEqual(ids, sorted(expected, key=lambda pk: (expected[pk], pk)))
+
+
+class FacetCountTests(TestCase):
+    """Facet counts on the search form and JSON endpoint follow the other selected filters"""
+
+    def setUp(self):
+        make_school(name='A', board='CBSE', rating=4.5, bus_availability=True)
+        make_school(name='B', board='CBSE', rating=3.2, bus_availability=False)
+        make_school(name='C', board='ICSE', rating=4.1, bus_availability=True)
+        school_index.invalidate()
+        cache.clear()
+
+    def test_json_counts(self):
+        facets = self.client.get(reverse('school_search_facets'), {'board': 'CBSE'}).json()['facets']
+        self.assertEqual(facets['rating'], {'3': 1, '4': 1})
+        self.assertEqual(facets['bus'], {'no': 1, 'yes': 1})
+        # A facet's own selection doesn't narrow its counts
+        self.assertEqual(facets['board'], {'CBSE': 2, 'ICSE': 1})
+
+    def test_form_counts(self):
+        response = self.client.get(reverse('school_search'), {'bus': 'yes'})
+        self.assertEqual(response.context['rating_choices'], [('5', 0), ('4', 2), ('3', 0), ('2', 0), ('1', 0)])
+        self.assertEqual(response.context['bus_choices'], [('yes', 'Yes', 2), ('no', 'No', 1)])
+        self.assertContains(response, 'data-facet="rating" data-value="4">(2)')
+
+
+class SearchBackendTests(TestCase):
+    """The full-text backend finds the same schools as the in-memory engine"""
+
+    names = [
+        'Kendriya Vidyalaya Adyar', 'Kendriya Vidyalaya No. 2', 'Vidya Mandir Senior Secondary',
+        'St. Thomas Academy', 'Thomas Global School', 'Global Indian International School',
+        'Chettinad Vidyashram', 'Padma Seshadri Bala Bhavan',
+    ]
+    queries = ['kendriya', 'vidya', 'kendriya vid', 'thomas', 'global', 'st thomas', 'padma bala', 'academ']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = {make_school(name=name, location='Chennai').pk: name for name in cls.names}
+
+    def setUp(self):
+        # The in-memory index is per process; rebuild it from this test's rows
+        name_index.invalidate()
+
+    def test_same_ids(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 backend needs SQLite')
+        fts, memory = SQLiteFTSBackend(), InMemorySearchBackend()
+        for query in self.queries:
+            found = {school_id for school_id, score in fts.search(query)}
+            self.assertTrue(found, query)
+            self.assertEqual(found, {school_id for school_id, score in memory.search(query)}, query)
+
+    def test_broad_query_is_not_capped(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 backend needs SQLite')
+        School.objects.bulk_create([
+            School(name=f'Vidya School {number}', location='Chennai', pin_code='600020', board='CBSE',
+                   grades_offered='1', distance=0, syllabus='CBSE', rating=4.0)
+            for number in range(1100)
+        ])
+        name_index.invalidate()
+        expected = School.objects.filter(name__icontains='vidya').count()
+        self.assertGreater(expected, 1000)
+        self.assertEqual(len(SQLiteFTSBackend().search('vidya')), expected)
+        self.assertEqual(len(InMemorySearchBackend().search('vidya')), expected)
+        self.assertEqual(len(SQLiteFTSBackend().search('vidya', limit=10)), 10)
+
+    def test_no_match(self):
+        self.assertEqual(SQLiteFTSBackend().search('zzzz'), InMemorySearchBackend().search('zzzz'))
+
+
+class FeeSortTests(TestCase):
+    """Sorting by fees puts free schools first and schools without fees last; free ones show ₹0"""
+
+    def test_free_school_first(self):
+        fees = {'Paid School': 50000, 'Free School': 0, 'Unknown Fees School': None}
+        ids = {}
+        for name, fee in fees.items():
+            ids[name] = make_school(name=name).pk
+            School.objects.filter(pk=ids[name]).update(default_fee=fee)
+        school_index.invalidate()
+        page = school_index.page(school_index.bits_for_ids(ids.values()), sort='fees', limit=None)
+        self.assertEqual(
+            [school_id for key, school_id in page],
+            [ids['Free School'], ids['Paid School'], ids['Unknown Fees School']],
+        )
+
+    def test_free_school_fee_shown(self):
+        school = make_school(name='Free School')
+        School.objects.filter(pk=school.pk).update(default_fee=0)
+        school = School.objects.get(pk=school.pk)
+        for template_name in ('partials/result_card.html', 'partials/school_address.html'):
+            html = render_to_string(template_name, {'school': school})
+            self.assertIn('₹0', html, template_name)
+            self.assertNotIn('No data', html, template_name)
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages neither repeat nor skip schools when rows change between requests"""
+
+    url = reverse('school_search_api')
+
+    def setUp(self):
+        for number in range(25):
+            make_school(name=f'School {number:02}', rating=number % 5, default_fee=number * 1000)
+        self.changed()
+
+    def changed(self):
+        # on_commit never fires inside a TestCase, so drop the cached index and results by hand
+        school_index.invalidate()
+        cache.clear()
+
+    def get_page(self, cursor='', **params):
+        response = self.client.get(self.url, {'fields': 'id', 'page_size': 10, 'cursor': cursor, **params})
+        data = json.loads(b''.join(response.streaming_content))
+        return [row['id'] for row in data['results']], data['next_cursor']
+
+    def walk(self, between_pages=None, **params):
+        seen, cursor = [], ''
+        while True:
+            ids, cursor = self.get_page(cursor, **params)
+            seen.extend(ids)
+            if not cursor:
+                return seen
+            if between_pages:
+                between_pages(seen)
+                self.changed()
+
+    def test_pages_cover_every_school_once(self):
+        for sort in ('rating', 'fees'):
+            seen = self.walk(sort=sort)
+            self.assertEqual(len(seen), len(set(seen)), sort)
+            self.assertEqual(set(seen), set(School.objects.values_list('pk', flat=True)), sort)
+
+    def test_rows_added_and_removed_between_pages(self):
+        before = set(School.objects.values_list('pk', flat=True))
+        added = []
+
+        def between_pages(seen):
+            # Remove a school already shown and add one that sorts before the cursor
+            School.objects.filter(pk=seen[0]).delete()
+            added.append(make_school(name='Added School', rating=5, default_fee=0).pk)
+
+        seen = self.walk(between_pages, sort='fees')
+        self.assertEqual(len(seen), len(set(seen)))
+        # Every original school is listed exactly once; the ones added behind the cursor are not
+        self.assertEqual(set(seen), before)
+        self.assertFalse(set(added) & set(seen))
+
+
+class GoogleMapsUrlTests(SimpleTestCase):
+    """parse_google_maps_url pulls the place ID, pin code and coordinates out of a Maps link"""
+
+    directions_url = (
+        'https://www.google.com/maps/dir//BVM+Global+Perungudi,+144,+Corporation+Rd,+Seevaram,+Perungudi,'
+        '+Chennai,+Tamil+Nadu+600096/data=!4m6!4m5!1m1!4e2!1m2!1m1!1s0x3a525d061f069083:0x46eb9a4220ffcaf3'
+        '?sa=X&ved=1t:57443&ictx=111'
+    )
+
+    def test_directions_link(self):
+        self.assertEqual(parse_google_maps_url(self.directions_url), {
+            'place_id': '0x3a525d061f069083:0x46eb9a4220ffcaf3', 'pin_code': '600096',
+            'latitude': None, 'longitude': None,
+        })
+
+    def test_pin_coordinates_win_over_viewport(self):
+        url = 'https://www.google.com/maps/place/Some+School/@13.0,80.0,17z/data=!3d13.0418!4d80.2341'
+        parsed = parse_google_maps_url(url)
+        self.assertEqual((parsed['latitude'], parsed['longitude']), (13.0418, 80.2341))
+
+    def test_query_place_id(self):
+        url = 'https://www.google.com/maps/search/?api=1&query=13.05,80.21&query_place_id=ChIJabc-123'
+        parsed = parse_google_maps_url(url)
+        self.assertEqual(parsed['place_id'], 'ChIJabc-123')
+        self.assertEqual((parsed['latitude'], parsed['longitude']), (13.05, 80.21))
+
+    def test_unparseable_links(self):
+        empty = {'place_id': '', 'pin_code': '', 'latitude': None, 'longitude': None}
+        for url in (None, '', 'not a url', 'https://example.com/@95.0,200.0,17z'):
+            self.assertEqual(parse_google_maps_url(url), empty, url)
+
+    def test_school_save_uses_link_coordinates(self):
+        school = School(
+            google_maps_link='https://www.google.com/maps/place/X/data=!3d12.9!4d80.1', pin_code='600020'
+        )
+        school.update_derived_fields()
+        self.assertEqual((school.latitude, school.longitude), (12.9, 80.1))
+        self.assertEqual(school.geohash, geohash_encode(12.9, 80.1))
+
+
+class PincodeGazetteerTests(SimpleTestCase):
+    """The memory-mapped gazetteer built from a pin-code CSV answers centroid lookups"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, 'pincodes.bin')
+
+    def build(self, rows):
+        csv_path = os.path.join(self.directory, 'pincodes.csv')
+        with open(csv_path, 'w', encoding='utf-8') as f:
+            f.write('officename,pincode,latitude,longitude\n' + ''.join(f'{row}\n' for row in rows))
+        call_command('build_pincode_gazetteer', csv_path, '--output', self.path, stdout=StringIO())
+        return PincodeGazetteer(self.path)
+
+    def test_lookup(self):
+        gazetteer = self.build([
+            'Adyar,600020,13.00,80.25',
+            'Gandhi Nagar,600020,13.02,80.27',    # Same pin: averaged
+            'Egmore,600008,13.08,80.26',
+            'Unknown,600099,NA,NA',               # Skipped
+            'Zero,600098,0,0',                    # Skipped
+        ])
+        self.assertEqual(len(gazetteer), 2)
+        # Coordinates are stored as float32
+        for pin, centroid in (('600020', (13.01, 80.26)), (600008, (13.08, 80.26))):
+            for found, expected in zip(gazetteer.lookup(pin), centroid):
+                self.assertAlmostEqual(found, expected, places=4)
+        for pin in ('600099', '110001', '', 'abc', None):
+            self.assertIsNone(gazetteer.lookup(pin), pin)
+
+    def test_missing_file(self):
+        gazetteer = PincodeGazetteer(self.path)
+        self.assertFalse(gazetteer.available())
+        self.assertIsNone(gazetteer.lookup('600020'))
+
+    def test_replaced_file_is_remapped(self):
+        gazetteer = self.build(['Adyar,600020,13.00,80.25'])
+        self.assertEqual(gazetteer.lookup('600020'), (13.0, 80.25))
+        write_gazetteer(self.path, {600020: (13.5, 80.5)})
+        # Force a new mtime even on filesystems with coarse timestamps
+        os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns + 10 ** 9))
+        self.assertEqual(gazetteer.lookup('600020'), (13.5, 80.5))
+
+    def test_not_a_gazetteer(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a gazetteer file')
+        with self.assertRaises(ValueError):
+            PincodeGazetteer(self.path).lookup('600020')
+
+    def test_unlisted_pin_code_has_no_coordinates(self):
+        self.build(['Adyar,600020,13.00,80.25'])
+        with override_settings(PINCODE_GAZETTEER_PATH=self.path):
+            self.assertEqual(get_pincode_coordinates('600 020'), (13.0, 80.25))
+            # No fallback to the rough approximation once a gazetteer exists
+            self.assertIsNone(get_pincode_coordinates('110001'))
+
+
+class FeeScheduleTests(SimpleTestCase):
+    """fees_by_grade strings are parsed once into FeeSchedules shared by the school's fee lookups"""
+
+    def test_parse(self):
+        schedule = FeeSchedule('12:400000, 11:380000,LKG:30000')
+        self.assertEqual(schedule.get(12), 400000)
+        self.assertEqual(schedule.get('11'), 380000)
+        self.assertEqual(schedule.get('LKG'), 30000)
+        self.assertIsNone(schedule.get(10))
+        self.assertEqual(schedule.default, 400000)
+        self.assertEqual(schedule.items(), [(11, 380000), (12, 400000)])
+
+    def test_default_without_grade_12(self):
+        self.assertEqual(FeeSchedule('UKG:35000,5:60000').default, 35000)
+        # A grade listed twice keeps its last amount
+        self.assertEqual(FeeSchedule('5:60000,5:65000').default, 65000)
+
+    def test_free_grades(self):
+        self.assertEqual(FeeSchedule('1:5000,12:0').default, 0)
+        self.assertEqual(FeeSchedule('12:0').items(), [(12, 0)])
+        self.assertTrue(FeeSchedule('12:0'))
+
+    def test_unparseable_strings(self):
+        for source in (None, '', 'N/A', '12:abc', '12:-500', 'fees on request'):
+            schedule = FeeSchedule(source)
+            self.assertFalse(schedule, source)
+            self.assertIsNone(schedule.default, source)
+            self.assertEqual(schedule.items(), [], source)
+        # Bad items are skipped, good ones kept
+        self.assertEqual(FeeSchedule('12:abc,11:1000,junk').default, 1000)
+
+    def test_parsed_once_per_school_and_string(self):
+        school = School(fees_by_grade='12:400000')
+        schedule = school.fee_schedule
+        self.assertEqual((school.get_default_fee(), school.get_fee_for_grade(12)), (400000, 400000))
+        self.assertIs(school.fee_schedule, schedule)
+        school.fees_by_grade = '12:0'
+        self.assertEqual(school.get_default_fee(), 0)
+        self.assertIsNot(school.fee_schedule, schedule)
+
+        schools = prime_fee_schedules([School(fees_by_grade='1:100'), School(fees_by_grade='1:100'), School()])
+        self.assertIs(schools[0].fee_schedule, schools[1].fee_schedule)
+        self.assertIsNone(schools[2].get_default_fee())
+
+
+class SearchApiTests(TestCase):
+    """The search API streams every result as JSON or NDJSON, chunk by chunk"""
+
+    url = reverse('school_search_api')
+
+    def setUp(self):
+        library = Facility.objects.create(name='Library')
+        for number, rating in enumerate((4.8, 4.5, 4.1, 3.9, 3.0)):
+            school = make_school(name=f'School {number}', rating=rating)
+            if number % 2 == 0:
+                school.facilities.add(library)
+        school_index.invalidate()
+        cache.clear()
+
+    def get(self, **params):
+        response = self.client.get(self.url, params)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_json(self):
+        with mock.patch('schools.views.API_CHUNK_SIZE', 2):
+            response, body = self.get(fields='name,rating,facilities')
+        data = json.loads(body)
+        self.assertEqual(response['X-Total-Count'], '5')
+        self.assertEqual((data['count'], data['next_cursor']), (5, None))
+        self.assertEqual([row['name'] for row in data['results']], [f'School {number}' for number in range(5)])
+        self.assertEqual(data['results'][0], {'name': 'School 0', 'rating': 4.8, 'facilities': ['Library']})
+        self.assertEqual(data['results'][1]['facilities'], [])
+
+    def test_ndjson_pages(self):
+        response, body = self.get(format='ndjson', fields='id', page_size=3)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        first = [json.loads(line)['id'] for line in body.splitlines()]
+        response, body = self.get(format='ndjson', fields='id', page_size=3, cursor=response['X-Next-Cursor'])
+        second = [json.loads(line)['id'] for line in body.splitlines()]
+        self.assertEqual((len(first), len(second)), (3, 2))
+        self.assertEqual(response['X-Next-Cursor'], '')
+        self.assertFalse(set(first) & set(second))
+
+    def test_unknown_field(self):
+        response = self.client.get(self.url, {'fields': 'name,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Unknown fields: password')
+
+    def test_error_mid_stream_leaves_the_document_unfinished(self):
+        def failing_rows(school_ids, fields, distances):
+            yield {'id': school_ids[0]}
+            raise DatabaseError('connection lost')
+
+        for params in ({'fields': 'id'}, {'fields': 'id', 'format': 'ndjson'}):
+            with mock.patch('schools.views._api_rows', failing_rows):
+                response = self.client.get(self.url, params)
+                received = []
+                with self.assertRaises(DatabaseError):
+                    for chunk in response.streaming_content:
+                        received.append(chunk.decode())
+            body = ''.join(received)
+            if params.get('format') == 'ndjson':
+                # Whole lines only: what arrived is still valid NDJSON
+                self.assertTrue(body.endswith('\n'))
+                self.assertEqual(len([json.loads(line) for line in body.splitlines()]), 1)
+            else:
+                # No closing ']}', so clients can't mistake the partial list for the full one
+                with self.assertRaises(ValueError):
+                    json.loads(body)
+
+
+class PrefixArrayTests(SimpleTestCase):
+    """PrefixArray.top() returns the most popular entries under a prefix, whichever path serves it"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = random.Random(5)
+        cls.keyed_entries = [
+            [''.join(rng.choice('abc') for _ in range(rng.randint(1, 6))) for _ in range(rng.randint(1, 3))]
+            for _ in range(400)
+        ]
+
+    def expected(self, prefix, k):
+        matching = [
+            entry for entry, keys in enumerate(self.keyed_entries) if any(key.startswith(prefix) for key in keys)
+        ]
+        return matching[:k]
+
+    def test_matches_brute_force(self):
+        # A low scan limit sends the wider ranges through the memoized path too
+        for scan_limit in (256, 8):
+            with mock.patch('schools.typeahead.RANGE_SCAN_LIMIT', scan_limit):
+                prefixes = PrefixArray(self.keyed_entries)
+                for prefix in ('a', 'b', 'ab', 'ca', 'abc', 'bca', 'aaaa', 'cabcab'):
+                    for k in (1, 5, 10):
+                        self.assertEqual(prefixes.top(prefix, k), self.expected(prefix, k), (scan_limit, prefix, k))
+                        # Repeated lookups (memoized or not) agree
+                        self.assertEqual(prefixes.top(prefix, k), self.expected(prefix, k))
+
+    def test_empty_and_unknown_prefixes(self):
+        prefixes = PrefixArray(self.keyed_entries)
+        self.assertEqual(prefixes.top('', 5), [])
+        self.assertEqual(prefixes.top('z', 5), [])
+        self.assertEqual(prefixes.top('abcz', 5), [])
+        self.assertEqual(PrefixArray([]).top('abc', 5), [])
+
+
+class TypeaheadTests(TestCase):
+    """The suggest endpoint ranks schools, localities and pin codes by popularity"""
+
+    def setUp(self):
+        make_school(name='Anna Nagar Public School', review_count=10, pin_code='600040',
+                    address_line_1='12, 2nd Avenue, Anna Nagar, Chennai')
+        make_school(name='Nagarjuna Vidyalaya', review_count=50, pin_code='600041',
+                    address_line_1='Nagarjuna Street, Nanganallur')
+        make_school(name='Adyar Academy', review_count=30, pin_code='600020', address_line_1='Adyar, Chennai 600020')
+        typeahead_index.invalidate()
+        cache.clear()
+
+    def suggest(self, q, **params):
+        response = self.client.get(reverse('school_suggest'), {'q': q, **params})
+        self.assertIn('max-age', response['Cache-Control'])
+        return response.json()
+
+    def test_word_prefixes_by_popularity(self):
+        data = self.suggest('naga')
+        self.assertEqual([school['name'] for school in data['schools']],
+                         ['Nagarjuna Vidyalaya', 'Anna Nagar Public School'])
+        self.assertEqual(data['localities'], ['Nagarjuna Street', 'Anna Nagar'])
+        self.assertEqual(data['pin_codes'], [])
+
+    def test_pin_codes(self):
+        self.assertEqual(self.suggest('6000')['pin_codes'], ['600041', '600020', '600040'])
+        self.assertEqual(self.suggest('6000', limit=1)['pin_codes'], ['600041'])
+
+    def test_empty_query(self):
+        for q in ('', '   ', '.,-'):
+            self.assertEqual(self.suggest(q), {'schools': [], 'localities': [], 'pin_codes': []}, q)
+
+
+class FragmentCacheTests(TestCase):
+    """Per-school fragments are rendered once per updated_at and re-rendered after any change they show"""
+
+    def setUp(self):
+        cache.clear()
+        self.school = make_school(name='Fragment School')
+
+    def render(self, template_name, school=None):
+        return render_fragments([(template_name, school or School.objects.get(pk=self.school.pk))])[0]
+
+    def test_rendered_once(self):
+        with mock.patch('schools.fragments.render_to_string', return_value='<p>card</p>') as render:
+            school = School.objects.get(pk=self.school.pk)
+            # The same fragment twice in one call is rendered once
+            html = render_fragments([('partials/result_card.html', school)] * 2)
+            self.render('partials/result_card.html')
+        self.assertEqual(html, ['<p>card</p>', '<p>card</p>'])
+        self.assertEqual(render.call_count, 1)
+
+    def test_school_save_renders_anew(self):
+        self.assertIn('Fragment School', self.render('partials/result_card.html'))
+        self.school.name = 'Renamed School'
+        self.school.save()
+        html = self.render('partials/result_card.html')
+        self.assertIn('Renamed School', html)
+        self.assertNotIn('Fragment School', html)
+
+    def test_facility_changes_render_anew(self):
+        self.assertIn('No facilities listed.', self.render('partials/school_facilities.html'))
+        library = Facility.objects.create(name='Library')
+        self.school.facilities.add(library)
+        self.assertIn('Library', self.render('partials/school_facilities.html'))
+        # Renaming a facility touches its schools without saving them
+        library.name = 'Reading Room'
+        library.save()
+        self.assertIn('Reading Room', self.render('partials/school_facilities.html'))
+
+    def test_review_moves_the_key(self):
+        key = fragment_key('partials/school_address.html', School.objects.get(pk=self.school.pk))
+        Review.objects.create(school=self.school, rating=4, reviewer_name='A')
+        self.assertNotEqual(fragment_key('partials/school_address.html', School.objects.get(pk=self.school.pk)), key)
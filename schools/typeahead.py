@@ -0,0 +1,177 @@
+"""In-memory typeahead over school names, localities and pin codes: sorted key arrays searched with bisect"""
+import bisect
+import heapq
+import re
+import threading
+from array import array
+
+from .caching import get_dataset_version
+from .models import School
+from .name_search import normalize
+
+
+# Most suggestions returned per type
+MAX_SUGGESTIONS = 10
+
+# Prefixes up to this length get their top suggestions precomputed at build time
+PRECOMPUTED_PREFIX_LENGTH = 2
+
+# Key ranges wider than this are ranked once and the result memoized per prefix
+RANGE_SCAN_LIMIT = 256
+
+KEY_SEPARATOR_RE = re.compile(r'[^a-z0-9]+')
+ADDRESS_PIN_RE = re.compile(r'\b\d{6}\b')
+LOCALITY_STRIP = ' -.'
+
+# Address segments that aren't localities: opening-hours noise and the city itself
+NON_LOCALITIES = {'closed', 'closes soon', 'chennai', 'india', 'tamil nadu', 'tamilnadu'}
+
+
+def suggestion_key(text):
+    """Normalized form of text for prefix matching ('T.Nagar' -> 't nagar')"""
+    return KEY_SEPARATOR_RE.sub(' ', normalize(text)).strip()
+
+
+def word_starts(key):
+    """The key from each word on, so a prefix of any word matches ('anna nagar' -> also 'nagar')"""
+    words = key.split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def localities(*address_lines):
+    """Locality names in address text: comma-separated segments without numbers"""
+    names = []
+    for line in address_lines:
+        for segment in (line or '').split(','):
+            segment = ADDRESS_PIN_RE.sub('', segment).strip(LOCALITY_STRIP)
+            if len(segment) < 3 or any(c.isdigit() for c in segment):
+                continue
+            if suggestion_key(segment) in NON_LOCALITIES:
+                continue
+            names.append(segment)
+    return names
+
+
+class PrefixArray:
+    """
+    Sorted keys with the entry each key belongs to. Entries are numbered in
+    popularity order (0 is the most popular), so the top-k entries under a
+    prefix are the k smallest entry numbers in its bisected key range.
+    """
+    __slots__ = ('_keys', '_entries', '_top')
+
+    def __init__(self, keyed_entries):
+        """keyed_entries: one list of keys per entry, most popular entry first"""
+        pairs = sorted(
+            (key, entry) for entry, keys in enumerate(keyed_entries) for key in set(keys) if key
+        )
+        self._keys = [key for key, entry in pairs]
+        self._entries = array('I', (entry for key, entry in pairs))
+        self._top = {}
+        for entry, keys in enumerate(keyed_entries):
+            for prefix in {key[:length] for key in keys for length in range(1, PRECOMPUTED_PREFIX_LENGTH + 1)}:
+                top = self._top.setdefault(prefix, [])
+                if len(top) < MAX_SUGGESTIONS:
+                    top.append(entry)
+
+    def top(self, prefix, k):
+        """The k most popular entries with a key starting with prefix"""
+        top = self._top.get(prefix)
+        if top is not None or len(prefix) <= PRECOMPUTED_PREFIX_LENGTH:
+            return (top or [])[:k]
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_left(self._keys, prefix + '\uffff')
+        if end - start <= RANGE_SCAN_LIMIT:
+            return heapq.nsmallest(k, set(self._entries[start:end]))
+        top = self._top[prefix] = heapq.nsmallest(MAX_SUGGESTIONS, set(self._entries[start:end]))
+        return top[:k]
+
+
+class TypeaheadIndex:
+    """
+    Per-process typeahead suggestions for the search form.
+
+    Schools are ranked by review count, then rating; localities (from the
+    address lines, or the combined location when those are empty) and pin
+    codes by how many reviews and schools they cover. Built lazily from the
+    School table and rebuilt whenever the dataset version changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._dataset_version = None
+        self._reset()
+
+    def _reset(self):
+        self._schools = []            # entry -> (school id, name)
+        self._localities = []         # entry -> locality name
+        self._pin_codes = []          # entry -> pin code
+        self._school_keys = PrefixArray([])
+        self._locality_keys = PrefixArray([])
+        self._pin_code_keys = PrefixArray([])
+
+    def build(self):
+        """(Re)build the suggestion arrays from the School table"""
+        with self._lock:
+            self._reset()
+            self._dataset_version = get_dataset_version()
+            rows = School.objects.values_list(
+                'id', 'name', 'pin_code', 'address_line_1', 'address_line_2', 'location', 'review_count', 'rating'
+            ).order_by('-review_count', '-rating', 'pk')
+
+            locality_stats = {}     # key -> [reviews, schools, first spelling seen]
+            pin_code_stats = {}     # pin -> [reviews, schools]
+            for school_id, name, pin_code, line_1, line_2, location, review_count, rating in rows.iterator(chunk_size=2000):
+                self._schools.append((school_id, name))
+                names = localities(line_1, line_2) if (line_1 or line_2) else localities(location)
+                for key, locality in {suggestion_key(locality): locality for locality in names}.items():
+                    stats = locality_stats.setdefault(key, [0, 0, locality])
+                    stats[0] += review_count
+                    stats[1] += 1
+                if pin_code:
+                    stats = pin_code_stats.setdefault(pin_code, [0, 0])
+                    stats[0] += review_count
+                    stats[1] += 1
+
+            ranked_localities = sorted(locality_stats.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+            self._localities = [stats[2] for key, stats in ranked_localities]
+            ranked_pin_codes = sorted(pin_code_stats.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+            self._pin_codes = [pin for pin, stats in ranked_pin_codes]
+
+            self._school_keys = PrefixArray([word_starts(suggestion_key(name)) for school_id, name in self._schools])
+            self._locality_keys = PrefixArray([word_starts(key) for key, stats in ranked_localities])
+            self._pin_code_keys = PrefixArray([[pin] for pin in self._pin_codes])
+            self._built = True
+
+    def ensure_built(self):
+        """Build the arrays if they are missing or older than the dataset version"""
+        if not self._built or self._dataset_version != get_dataset_version():
+            self.build()
+
+    def invalidate(self):
+        """Drop the arrays; they are rebuilt on next use"""
+        with self._lock:
+            self._built = False
+            self._reset()
+
+    def suggest(self, query, k=5):
+        """
+        Top-k suggestions for a partly typed query as {'schools': [{'id',
+        'name'}, ...], 'localities': [name, ...], 'pin_codes': [pin, ...]}.
+        """
+        key = suggestion_key(query)
+        k = max(1, min(k, MAX_SUGGESTIONS))
+        with self._lock:
+            self.ensure_built()
+            if not key:
+                return {'schools': [], 'localities': [], 'pin_codes': []}
+            schools = [self._schools[entry] for entry in self._school_keys.top(key, k)]
+            return {
+                'schools': [{'id': school_id, 'name': name} for school_id, name in schools],
+                'localities': [self._localities[entry] for entry in self._locality_keys.top(key, k)],
+                'pin_codes': [self._pin_codes[entry] for entry in self._pin_code_keys.top(key, k)] if key.isdigit() else [],
+            }
+
+
+typeahead_index = TypeaheadIndex()
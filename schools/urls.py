@@ -5,7 +5,12 @@ urlpatterns = [
     path('', views.home_view, name='home'),
     path('search/', views.school_search_view, name='school_search'),
     path('search/results/', views.school_search_results_view, name='school_search_results'),
+    path('search/results/more/', views.school_search_results_more_view, name='school_search_results_more'),
+    path('search/facets/', views.school_search_facets_view, name='school_search_facets'),
+    path('search/suggest/', views.school_suggest_view, name='school_suggest'),
     path('school/<int:school_id>/', views.school_detail_view, name='school_detail'),
+    path('school/<int:school_id>/reviews/', views.school_reviews_view, name='school_reviews'),
+    path('api/schools/', views.school_search_api_view, name='school_search_api'),
     path('ai-picker/', views.ai_picker_view, name='ai_picker'),
 ]
 
@@ -1,5 +1,36 @@
-"""Utility functions for school distance calculations"""
+"""Utility functions for school distance calculations and record matching"""
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
 import math
+import re
+import unicodedata
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+from .gazetteer import pincode_gazetteer
+
+
+# Mean radius of the earth in kilometers
+EARTH_RADIUS_KM = 6371
+
+# Length of one degree of latitude in kilometers
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+NON_ALPHANUMERIC_RE = re.compile(r'[^a-z0-9]+')
+
+# Geohash base-32 digits; their ASCII order is the order of the cells they name
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Characters stored in School.geohash (~5 m cells)
+GEOHASH_PRECISION = 9
+
+# Most geohash prefixes a radius query is turned into
+GEOHASH_MAX_CELLS = 16
 
 
 def calculate_distance_between_pincodes(pincode1, pincode2):
@@ -40,22 +71,23 @@ def calculate_distance_between_pincodes(pincode1, pincode2):
 
 def get_pincode_coordinates(pincode):
     """
-    Get approximate coordinates for a pin code.
-    This is a placeholder - in production, use a geocoding API.
+    Get coordinates for a pin code.
     
     Returns (lat, lon) tuple or None
     
-    Note: This is a simplified approximation. For accurate results, integrate with:
-    - Google Geocoding API
-    - OpenStreetMap Nominatim API  
-    - India Post API
-    - pincode database
+    When the pin-code gazetteer has been built (manage.py build_pincode_gazetteer),
+    this is the pin code's centroid from that dataset, or None for pin codes it
+    doesn't list. Without a gazetteer it falls back to the rough approximation
+    below, which is NOT geographically accurate.
     """
     try:
         pin = ''.join(filter(str.isdigit, str(pincode)))[:6]
         if not pin or len(pin) != 6:
             return None
         
+        if pincode_gazetteer.available():
+            return pincode_gazetteer.lookup(pin)
+        
         pin_int = int(pin)
         
         # Indian pin codes: first digit indicates region
@@ -109,10 +141,26 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
     c = 2 * math.asin(math.sqrt(a))
     
-    # Radius of earth in kilometers
-    r = 6371
+    return c * EARTH_RADIUS_KM
+
+
+def haversine_many(origin, latitudes, longitudes):
+    """
+    Great circle distances (km) from origin, a (lat, lon) tuple, to many points.
+    
+    With NumPy, latitudes and longitudes may be arrays or sequences and the
+    result is a float array computed in one vectorized pass; without it, a
+    list computed point by point. NaN coordinates give NaN distances.
+    """
+    lat, lon = origin
+    if not NUMPY_AVAILABLE:
+        return [haversine_distance(lat, lon, lat2, lon2) for lat2, lon2 in zip(latitudes, longitudes)]
     
-    return c * r
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2 = np.radians(np.asarray(latitudes, dtype=float))
+    lon2 = np.radians(np.asarray(longitudes, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
 
 
 def calculate_distance(user_pincode, school_pincode):
@@ -138,3 +186,164 @@ def calculate_distance(user_pincode, school_pincode):
         # Fallback to simple approximation
         return calculate_distance_between_pincodes(user_pincode, school_pincode)
 
+
+
+def bounding_box(lat, lon, radius_km):
+    """
+    Get the lat/lon box enclosing a circle of radius_km around (lat, lon).
+    
+    Returns (min_lat, max_lat, min_lon, max_lon) in decimal degrees. The box
+    is a cheap, index-friendly prefilter; exact distances still have to be
+    checked with the Haversine formula.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    # Degrees of longitude shrink towards the poles
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    lon_delta = radius_km / (KM_PER_DEGREE * cos_lat)
+    return (lat - lat_delta, lat + lat_delta, lon - lon_delta, lon + lon_delta)
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    """
+    Geohash of a coordinate: alternating longitude and latitude bisection
+    bits, five per base-32 character. Nearby points share long prefixes.
+    """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """(height, width) in degrees of a geohash cell with precision characters"""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def geohash_cover(lat, lon, radius_km, max_cells=GEOHASH_MAX_CELLS):
+    """
+    Geohash prefixes whose cells together cover the circle of radius_km
+    around (lat, lon).
+    
+    Uses the longest prefixes for which the circle's bounding box spans at
+    most max_cells cells, so the prefixes stay few while matching as little
+    outside the circle as possible. Raises ValueError for a radius that is
+    negative, infinite or NaN.
+    """
+    if not (math.isfinite(radius_km) and radius_km >= 0):
+        raise ValueError(f'Invalid radius: {radius_km!r}')
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+    
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = geohash_cell_size(precision)
+        # Cell rows and columns of the box's corners (the top/right edges of the map stay in the last cell)
+        rows = [min(int((value + 90.0) // height), round(180.0 / height) - 1) for value in (min_lat, max_lat)]
+        columns = [min(int((value + 180.0) // width), round(360.0 / width) - 1) for value in (min_lon, max_lon)]
+        if (rows[1] - rows[0] + 1) * (columns[1] - columns[0] + 1) <= max_cells or precision == 1:
+            return sorted({
+                geohash_encode(-90.0 + (row + 0.5) * height, -180.0 + (column + 0.5) * width, precision)
+                for row in range(rows[0], rows[1] + 1)
+                for column in range(columns[0], columns[1] + 1)
+            })
+
+
+def geohash_prefix_range(prefix):
+    """
+    (low, high) bounds of the geohashes starting with prefix, for an indexed
+    range lookup: low <= geohash < high. high is None for the last prefix.
+    """
+    chars = list(prefix)
+    while chars:
+        position = GEOHASH_ALPHABET.index(chars[-1])
+        if position + 1 < len(GEOHASH_ALPHABET):
+            chars[-1] = GEOHASH_ALPHABET[position + 1]
+            return prefix, ''.join(chars)
+        chars.pop()
+    return prefix, None
+
+
+def geohash_filter(lat, lon, radius_km, field='geohash'):
+    """
+    Q object matching rows whose geohash lies in a cell covering the circle
+    of radius_km around (lat, lon): one index range scan per prefix.
+    """
+    condition = Q()
+    for prefix in geohash_cover(lat, lon, radius_km):
+        low, high = geohash_prefix_range(prefix)
+        prefix_condition = Q(**{f'{field}__gte': low})
+        if high is not None:
+            prefix_condition &= Q(**{f'{field}__lt': high})
+        condition |= prefix_condition
+    return condition
+
+
+def haversine_expression(lat, lon, lat_field='latitude', lon_field='longitude'):
+    """
+    Build a database expression for the Haversine distance (in km) between
+    (lat, lon) and the coordinates stored in lat_field/lon_field.
+    
+    Uses only functions available on both PostgreSQL and SQLite.
+    """
+    lat_rad = Value(math.radians(lat), output_field=FloatField())
+    lon_rad = Value(math.radians(lon), output_field=FloatField())
+    cos_lat = Value(math.cos(math.radians(lat)), output_field=FloatField())
+    
+    dlat = Radians(F(lat_field)) - lat_rad
+    dlon = Radians(F(lon_field)) - lon_rad
+    a = (
+        Power(Sin(dlat / 2), 2)
+        + cos_lat * Cos(Radians(F(lat_field))) * Power(Sin(dlon / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM, output_field=FloatField()) * ASin(Sqrt(a))
+
+
+def annotate_distance(queryset, origin, max_distance=None):
+    """
+    Annotate a School queryset with calculated_distance (km) from origin.
+    
+    origin is a (lat, lon) tuple. Schools without stored coordinates are
+    excluded. When max_distance is given, rows are first narrowed to the
+    geohash prefixes covering the radius (one range scan each on the indexed
+    geohash column) and then filtered on the exact distance, all inside the
+    database.
+    """
+    lat, lon = origin
+    queryset = queryset.filter(latitude__isnull=False, longitude__isnull=False)
+    
+    if max_distance is not None:
+        queryset = queryset.filter(geohash_filter(lat, lon, max_distance))
+    
+    queryset = queryset.annotate(calculated_distance=haversine_expression(lat, lon))
+    
+    if max_distance is not None:
+        queryset = queryset.filter(calculated_distance__lte=max_distance)
+    
+    return queryset
+
+
+def normalize_school_name(name):
+    """
+    Lowercase a school name, strip accents and collapse punctuation and
+    whitespace, so "St. Mary's  School" and "st marys school" compare equal.
+    """
+    text = unicodedata.normalize('NFKD', str(name or ''))
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return NON_ALPHANUMERIC_RE.sub(' ', text.replace("'", '')).strip()
@@ -1,14 +1,61 @@
+import bisect
+import json
+import math
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max, Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Q, Avg, Count, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
 from django_filters import FilterSet, CharFilter, ChoiceFilter, BooleanFilter, NumberFilter
-from .models import School, Facility, Review
+from .models import School, Facility, Review, SchoolFee
 from curriculum.models import Curriculum
-from .utils import calculate_distance
+from .bitmap_index import school_index
+from .caching import (
+    RESULT_CACHE_SIZE, RESULT_CACHE_TIMEOUT, SCHOOL_PAGE_CACHE_TIMEOUT, school_page_key, versioned_key,
+)
+from .distances import school_coordinates
+from .facets import get_facet_counts
+from .fragments import render_fragments
+from .listing import listing_rows
+from .pagination import REVIEW_PAGE_SIZE, decode_cursor, encode_cursor, parse_page_size
+from .search_backends import get_search_backend
+from .typeahead import typeahead_index
+from .utils import get_pincode_coordinates
+
+
+# Supported orderings for search results
+SORT_OPTIONS = ('rating', 'fees', 'distance', 'relevance')
+
+# Schools listed in the detail page's "Nearby Schools" section
+NEARBY_SCHOOLS_COUNT = 5
+
+# Fields the search API can return (?fields=name,rating,...); distance is only
+# filled when the search has a user pin code, facilities is a list of names
+API_FIELDS = (
+    'id', 'name', 'location', 'pin_code', 'board', 'grades_offered', 'co_ed_type', 'bus_availability',
+    'syllabus', 'website', 'curriculum_website', 'google_maps_link', 'phone_number', 'address_line_1',
+    'address_line_2', 'latitude', 'longitude', 'rating', 'review_count', 'review_average',
+    'default_fee', 'fees_by_grade', 'top_review', 'updated_at', 'distance', 'facilities',
+)
+
+# Fields returned when the request doesn't name any
+API_DEFAULT_FIELDS = ('id', 'name', 'location', 'pin_code', 'board', 'rating', 'review_count', 'default_fee')
+
+# Schools fetched per query while streaming API results
+API_CHUNK_SIZE = 500
+
+# How long (seconds) browsers and proxies may reuse typeahead suggestions
+SUGGEST_MAX_AGE = 300
 
 
 class SchoolFilter(FilterSet):
     """Filter for school search"""
-    name = CharFilter(field_name='name', lookup_expr='icontains', label='School Name')
+    name = CharFilter(method='filter_by_name', label='School Name')
     board = ChoiceFilter(choices=School.BOARD_CHOICES)
     grade = CharFilter(method='filter_by_grade', label='Grade')
     co_ed_type = ChoiceFilter(choices=School.CO_ED_CHOICES)
@@ -22,10 +69,16 @@ class SchoolFilter(FilterSet):
         model = School
         fields = ['name', 'board', 'grade', 'co_ed_type', 'pin_code', 'distance_max', 'bus_availability', 'min_rating']
     
+    def filter_by_name(self, queryset, name, value):
+        """Filter schools by name using the full-text search backend"""
+        if value:
+            return queryset.filter(pk__in=[pk for pk, score in get_search_backend().search(value)])
+        return queryset
+    
     def filter_by_grade(self, queryset, name, value):
         """Filter schools that offer the specified grade"""
-        if value:
-            return queryset.filter(grades_offered__icontains=value)
+        if value and value.strip().isdigit():
+            return queryset.offering_grade(value.strip())
         return queryset
     
     def filter_by_facilities(self, queryset, name, value):
@@ -33,7 +86,8 @@ class SchoolFilter(FilterSet):
         if value:
             facility_ids = [int(fid) for fid in value.split(',') if fid.isdigit()]
             if facility_ids:
-                return queryset.filter(facilities__id__in=facility_ids).distinct()
+                # Resolved from the bitmap index, so no join or .distinct() is needed
+                return queryset.filter(pk__in=school_index.to_ids(school_index.resolve(facilities=facility_ids)))
         return queryset
 
 
@@ -72,8 +126,27 @@ def school_search_view(request):
     selected_co_ed = request.GET.getlist('co_ed_type', [])
     distance_max = request.GET.get('distance_max', '50')
     
+    # Option counts under the currently selected filters, e.g. "CBSE (412)"
+    filters = _search_filters(request)
+    facets = get_facet_counts(filters, lambda: _narrow_schools(filters)[0])['facets']
+    board_counts = facets['board']
+    
     context = {
-        'board_choices': School.BOARD_CHOICES,
+        'board_choices': [
+            (value, label, board_counts.get(value, 0)) for value, label in School.BOARD_CHOICES
+        ],
+        'rating_choices': [(str(stars), facets['rating'].get(str(stars), 0)) for stars in range(5, 0, -1)],
+        'bus_choices': [
+            (value, label, facets['bus'].get(value, 0)) for value, label in (('yes', 'Yes'), ('no', 'No'))
+        ],
+        'co_ed_counts': facets['co_ed_type'],
+        'grade_choices': [(int(grade), count) for grade, count in facets['grade'].items()],
+        'selected_grade': filters['grade'],
+        'facility_choices': [
+            (facility.pk, facility.name, facets['facility'].get(str(facility.pk), 0))
+            for facility in Facility.objects.order_by('name')
+        ],
+        'selected_facilities': filters['facilities'],
         'selected_boards': selected_boards,
         'selected_ratings': selected_ratings,
         'selected_bus': selected_bus,
@@ -83,108 +156,397 @@ def school_search_view(request):
     return render(request, 'search_form.html', context)
 
 
-def school_search_results_view(request):
-    """School search results page"""
-    schools = School.objects.prefetch_related('facilities')
+def _search_filters(request):
+    """
+    Parse the search filters from the request's GET parameters.
     
+    Values are normalized (deduplicated, sorted, typed) so equal filter sets
+    compare and cache alike regardless of parameter order.
+    """
     # Get search parameters
-    name = request.GET.get('name', '')
+    name = request.GET.get('name', '').strip()
     boards = request.GET.getlist('board')  # Multiple boards
-    grade = request.GET.get('grade', '')
+    grade = request.GET.get('grade', '').strip()
     user_pin_code = request.GET.get('user_pin_code', '').strip()
     distance_max = request.GET.get('distance_max', '50')  # Distance slider max value
     ratings = request.GET.getlist('rating')  # Multiple ratings (1-5)
     bus_availability = request.GET.getlist('bus')  # Multiple bus options
     co_ed_types = request.GET.getlist('co_ed_type')  # Multiple co-ed types
+    facilities = ','.join(request.GET.getlist('facilities'))  # Facility IDs, repeated and/or comma-separated
+    fee_max = request.GET.get('fee_max', '').strip()  # Max annual fee in ₹
     
-    # Apply filters
-    if name:
-        schools = schools.filter(name__icontains=name)
-    
-    if boards:
-        schools = schools.filter(board__in=boards)
-    
-    if grade:
-        schools = schools.filter(grades_offered__icontains=grade)
-    
-    if ratings:
-        # Filter by exact star ratings (e.g., 2* means rating >= 2.0 and < 3.0)
-        rating_conditions = Q()
-        for rating in ratings:
-            try:
-                rating_int = int(rating)
-                if 1 <= rating_int <= 5:
-                    # Match ratings in the range [rating_int, rating_int + 1)
-                    rating_conditions |= Q(rating__gte=rating_int) & Q(rating__lt=rating_int + 1.0)
-            except (ValueError, TypeError):
-                pass
-        if rating_conditions:
-            schools = schools.filter(rating_conditions)
-    
-    if bus_availability:
-        if 'yes' in bus_availability and 'no' not in bus_availability:
-            schools = schools.filter(bus_availability=True)
-        elif 'no' in bus_availability and 'yes' not in bus_availability:
-            schools = schools.filter(bus_availability=False)
-        # If both yes and no are selected, show all (no filter)
-    
-    if co_ed_types:
-        schools = schools.filter(co_ed_type__in=co_ed_types)
-    
-    # Evaluate queryset and calculate distances if user pin code is provided
-    schools_list = list(schools)
-    
-    # Calculate distances from user's location for each school
-    if user_pin_code:
-        for school in schools_list:
-            distance = calculate_distance(user_pin_code, school.pin_code)
-            school.calculated_distance = round(distance, 1) if distance else None
-            school.default_fee = school.get_default_fee()
-    else:
-        for school in schools_list:
-            school.calculated_distance = None
-            school.default_fee = school.get_default_fee()
+    # Filter by exact star ratings (e.g., 2* means rating >= 2.0 and < 3.0)
+    rating_buckets = []
+    for rating in ratings:
+        try:
+            rating_int = int(rating)
+            if 1 <= rating_int <= 5:
+                rating_buckets.append(rating_int)
+        except (ValueError, TypeError):
+            pass
     
-    # Filter by distance if distance_max is provided and user pin code is provided
-    if distance_max and user_pin_code:
+    bus = None
+    if 'yes' in bus_availability and 'no' not in bus_availability:
+        bus = True
+    elif 'no' in bus_availability and 'yes' not in bus_availability:
+        bus = False
+    # If both yes and no are selected, show all (no filter)
+    
+    # nan, inf and negative radii are ignored like unparseable ones
+    max_distance = None
+    if distance_max:
         try:
             max_distance = float(distance_max)
-            filtered_schools = []
-            for school in schools_list:
-                if school.calculated_distance is not None and school.calculated_distance <= max_distance:
-                    filtered_schools.append(school)
-            schools_list = filtered_schools
         except (ValueError, TypeError):
             pass
+        else:
+            if not (math.isfinite(max_distance) and max_distance >= 0):
+                max_distance = None
     
-    # Sort results
-    sort_by = request.GET.get('sort', 'rating')
-    if sort_by == 'fees':
-        schools_list = sorted(schools_list, key=lambda s: s.default_fee if s.default_fee else float('inf'))
-    else:
-        schools_list = sorted(schools_list, key=lambda s: (float(s.rating) if s.rating else 0, s.name), reverse=True)
+    return {
+        'name': name,
+        'boards': sorted(set(boards)),
+        'co_ed_types': sorted(set(co_ed_types)),
+        'bus': bus,
+        'ratings': sorted(set(rating_buckets)),
+        'grade': int(grade) if grade.isdigit() else None,
+        'facilities': sorted({int(fid) for fid in facilities.split(',') if fid.isdigit()}),
+        'fee_max': int(fee_max) if fee_max.isdigit() else None,
+        'user_pin_code': user_pin_code,
+        'max_distance': max_distance,
+    }
+
+
+def _narrow_schools(filters):
+    """
+    Apply the non-categorical filters (fees, name, distance).
     
-    context = {
+    Returns (bits, relevance, distances): the bitset of remaining schools (None
+    when none of these filters is active), name-match scores and distances by
+    school ID (each None when that filter is inactive).
+    """
+    bits = None
+    
+    # Fee ceilings are indexed range queries: on SchoolFee (grade, amount) when
+    # a grade is selected, otherwise on School.default_fee
+    if filters['fee_max'] is not None:
+        if filters['grade'] is not None:
+            fee_ids = SchoolFee.objects.filter(
+                grade=filters['grade'], amount__lte=filters['fee_max']
+            ).values_list('school_id', flat=True)
+        else:
+            fee_ids = School.objects.filter(default_fee__lte=filters['fee_max']).values_list('pk', flat=True)
+        bits = school_index.bits_for_ids(fee_ids)
+    
+    # Name text is matched by the database's full-text engine (FTS5 on SQLite,
+    # tsvector/trigram on PostgreSQL), which returns ranked IDs
+    relevance = None
+    if filters['name']:
+        relevance = dict(get_search_backend().search(filters['name']))
+        name_bits = school_index.bits_for_ids(relevance)
+        bits = name_bits if bits is None else bits & name_bits
+    
+    # Distances come from the cached coordinate arrays (the user's pin is
+    # geocoded once, here): a radius only reads the grid cells it overlaps,
+    # while sorting by distance alone needs one vectorized pass over every school
+    distances = None
+    user_pin_code = filters['user_pin_code']
+    origin = get_pincode_coordinates(user_pin_code) if user_pin_code else None
+    if origin:
+        if filters['max_distance'] is not None:
+            distances = school_coordinates.within(origin, filters['max_distance'])
+        else:
+            distances = school_coordinates.distances(origin)
+        distance_bits = school_index.bits_for_ids(distances)
+        bits = distance_bits if bits is None else bits & distance_bits
+    
+    return bits, relevance, distances
+
+
+def _search_sort(request, filters):
+    """The requested sort order, or 'rating' when it can't apply to these filters"""
+    name = filters['name']
+    sort_by = request.GET.get('sort', 'relevance' if name else 'rating')
+    if sort_by == 'distance':
+        user_pin_code = filters['user_pin_code']
+        if not (user_pin_code and get_pincode_coordinates(user_pin_code)):
+            return 'rating'
+    if sort_by not in SORT_OPTIONS or (sort_by == 'relevance' and not name):
+        return 'rating'
+    return sort_by
+
+
+def _ranked_results(filters, sort_by, after=None, limit=RESULT_CACHE_SIZE):
+    """
+    Run the search and return the first `limit` results (all of them when
+    limit is None) after the keyset cursor `after` as {'keys': [sort key, ...],
+    'count': total matches, 'distances': {school_id: km} or None}. Each key
+    ends with the school ID.
+    """
+    # Categorical filters are resolved by the in-memory bitmap index
+    matches = school_index.resolve(
+        boards=filters['boards'],
+        co_ed_types=filters['co_ed_types'],
+        bus=filters['bus'],
+        ratings=filters['ratings'],
+        grade=filters['grade'],
+        facilities=filters['facilities'],
+    )
+    narrowed, relevance, distances = _narrow_schools(filters)
+    if narrowed is not None:
+        matches &= narrowed
+    
+    # Keyset selection: only the rows after the cursor key are considered, and
+    # only `limit` of them are selected (no full sort)
+    try:
+        page = school_index.page(matches, sort_by, after, limit, distances, relevance)
+    except TypeError:
+        # Cursor key doesn't fit this sort order; start from the top
+        page = school_index.page(matches, sort_by, None, limit, distances, relevance)
+    
+    return {
+        'keys': [key for key, pk in page],
+        # Counting is a popcount on the match bitset, independent of paging
+        'count': school_index.count(matches),
+        'distances': {pk: distances[pk] for key, pk in page} if distances is not None else None,
+    }
+
+
+def _search_schools(request):
+    """
+    Run a school search from the request's GET parameters and return one
+    keyset page of results plus the cursor for the next page.
+    
+    The first RESULT_CACHE_SIZE ranked IDs of a search are cached under its
+    normalized filters, sort order and the dataset version, so repeated
+    searches and their next pages skip the search entirely. Pages past the
+    cached window are computed live from the cursor.
+    """
+    filters = _search_filters(request)
+    page_size = parse_page_size(request.GET.get('page_size'))
+    sort_by = _search_sort(request, filters)
+    after = decode_cursor(request.GET.get('cursor'), sort_by)
+    
+    cache_key = versioned_key('school_search', [filters, sort_by])
+    results = cache.get(cache_key)
+    if results is None:
+        results = _ranked_results(filters, sort_by)
+        cache.set(cache_key, results, RESULT_CACHE_TIMEOUT)
+    
+    keys = results['keys']
+    try:
+        start = bisect.bisect_right(keys, after) if after is not None else 0
+    except TypeError:
+        # Cursor key doesn't fit this sort order; start from the top
+        start = 0
+    page = keys[start:start + page_size + 1]
+    distances = results['distances']
+    if len(page) <= page_size and len(keys) < results['count']:
+        # Past the cached window
+        results = _ranked_results(filters, sort_by, after, page_size + 1)
+        page, distances = results['keys'], results['distances']
+    
+    has_more = len(page) > page_size
+    page = page[:page_size]
+    next_cursor = encode_cursor(sort_by, page[-1]) if has_more else None
+    
+    # Cards are built from lean rows holding only the columns they show, and
+    # their HTML comes from the per-school fragment cache in one round trip
+    schools_list = listing_rows(key[-1] for key in page)
+    cards = render_fragments([('partials/result_card.html', school) for school in schools_list])
+    for school, card_html in zip(schools_list, cards):
+        school.card_html = card_html
+    
+    for school in schools_list:
+        if distances is not None:
+            school.calculated_distance = round(distances[school.pk], 1)
+        else:
+            school.calculated_distance = None
+    
+    return {
         'schools': schools_list,
-        'schools_count': len(schools_list),
-        'board_choices': School.BOARD_CHOICES,
-        'user_pin_code': user_pin_code,
+        'schools_count': results['count'],
+        'next_cursor': next_cursor,
+        'sort': sort_by,
+        'user_pin_code': filters['user_pin_code'],
     }
+
+
+def school_search_results_view(request):
+    """School search results page"""
+    context = _search_schools(request)
+    context['board_choices'] = School.BOARD_CHOICES
     return render(request, 'search_results.html', context)
 
 
+def school_search_results_more_view(request):
+    """Next page of result cards as an HTML fragment, for infinite scroll"""
+    context = _search_schools(request)
+    response = render(request, 'partials/result_cards.html', context)
+    response['X-Next-Cursor'] = context['next_cursor'] or ''
+    return response
+
+
+def school_search_facets_view(request):
+    """Facet counts for the given search filters as JSON"""
+    filters = _search_filters(request)
+    return JsonResponse(get_facet_counts(filters, lambda: _narrow_schools(filters)[0]))
+
+
+def school_suggest_view(request):
+    """Typeahead suggestions (schools, localities, pin codes) for ?q= as small, cacheable JSON"""
+    try:
+        limit = int(request.GET.get('limit', 5))
+    except ValueError:
+        limit = 5
+    response = JsonResponse(typeahead_index.suggest(request.GET.get('q', ''), limit))
+    patch_cache_control(response, public=True, max_age=SUGGEST_MAX_AGE)
+    return response
+
+
+def _api_fields(request):
+    """The requested API fields in request order; raises ValueError naming unknown ones"""
+    requested = [field.strip() for field in request.GET.get('fields', '').split(',') if field.strip()]
+    if not requested:
+        return list(API_DEFAULT_FIELDS)
+    unknown = [field for field in requested if field not in API_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(requested))
+
+
+def _api_rows(school_ids, fields, distances):
+    """
+    Yield a {field: value} dict per school, in the order of school_ids.
+    
+    Schools are read API_CHUNK_SIZE IDs at a time, each chunk streamed from
+    the database with .iterator(), so memory stays flat however many
+    results there are.
+    """
+    columns = [field for field in fields if field not in ('id', 'distance', 'facilities')]
+    links = School.facilities.through.objects
+    for start in range(0, len(school_ids), API_CHUNK_SIZE):
+        chunk = school_ids[start:start + API_CHUNK_SIZE]
+        rows = {
+            row['id']: row
+            for row in School.objects.filter(pk__in=chunk).values('id', *columns).iterator(chunk_size=API_CHUNK_SIZE)
+        }
+        facility_names = {}
+        if 'facilities' in fields:
+            for school_id, name in links.filter(school_id__in=chunk).order_by('school_id', 'facility_id').values_list(
+                'school_id', 'facility__name'
+            ).iterator(chunk_size=API_CHUNK_SIZE):
+                facility_names.setdefault(school_id, []).append(name)
+        for school_id in chunk:
+            row = rows.get(school_id)
+            if row is None:
+                continue
+            row['distance'] = round(distances[school_id], 2) if distances is not None else None
+            row['facilities'] = facility_names.get(school_id, [])
+            yield {
+                field: float(row[field]) if isinstance(row[field], Decimal) else row[field]
+                for field in fields
+            }
+
+
+def school_search_api_view(request):
+    """
+    Search results as streamed JSON, or NDJSON with ?format=ndjson (or an
+    Accept: application/x-ndjson header).
+    
+    Takes the same filter, sort and cursor parameters as the results page,
+    plus fields= to pick the returned columns. Without page_size every
+    result after the cursor is streamed; with it, one page plus the cursor
+    for the next.
+    """
+    try:
+        fields = _api_fields(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e), 'fields': list(API_FIELDS)}, status=400)
+    
+    filters = _search_filters(request)
+    sort_by = _search_sort(request, filters)
+    after = decode_cursor(request.GET.get('cursor'), sort_by)
+    page_size = parse_page_size(request.GET['page_size']) if 'page_size' in request.GET else None
+    
+    results = _ranked_results(filters, sort_by, after, page_size + 1 if page_size else None)
+    keys = results['keys']
+    next_cursor = None
+    if page_size and len(keys) > page_size:
+        keys = keys[:page_size]
+        next_cursor = encode_cursor(sort_by, keys[-1])
+    rows = _api_rows([key[-1] for key in keys], fields, results['distances'])
+    
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    ndjson = request.GET.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', '')
+    if ndjson:
+        response = StreamingHttpResponse(
+            (encoder.encode(row) + '\n' for row in rows), content_type='application/x-ndjson'
+        )
+    else:
+        def stream():
+            yield '{"count":%d,"sort":%s,"next_cursor":%s,"results":[' % (
+                results['count'], json.dumps(sort_by), json.dumps(next_cursor)
+            )
+            for position, row in enumerate(rows):
+                yield (',' if position else '') + encoder.encode(row)
+            yield ']}'
+        response = StreamingHttpResponse(stream(), content_type='application/json')
+    response['X-Total-Count'] = results['count']
+    response['X-Next-Cursor'] = next_cursor or ''
+    return response
+
+
+def _school_page_validators(school_id):
+    """
+    (ETag, Last-Modified timestamp) of a school's detail page, from the
+    school's updated_at and its latest review, in one query.
+    """
+    row = School.objects.filter(pk=school_id).annotate(
+        last_review=Max('reviews__created_at')
+    ).values_list('updated_at', 'last_review').first()
+    if row is None:
+        raise Http404('No School matches the given query.')
+    updated_at, last_review = row
+    last_modified = max(updated_at, last_review) if last_review else updated_at
+    review_stamp = int(last_review.timestamp() * 1e6) if last_review else 0
+    etag = quote_etag(f'{school_id}-{int(updated_at.timestamp() * 1e6)}-{review_stamp}')
+    return etag, int(last_modified.timestamp())
+
+
 def school_detail_view(request, school_id):
-    """School detail page"""
+    """
+    School detail page.
+    
+    Conditional GETs are answered with 304 after a single validator query.
+    Rendered pages are cached per school along with the ETag they were
+    rendered for; schools.signals deletes the entry when the school or its
+    reviews change. The nearby-schools section may lag behind edits to
+    other schools until the entry expires.
+    """
+    etag, last_modified = _school_page_validators(school_id)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        cache_key = school_page_key(school_id)
+        cached = cache.get(cache_key)
+        if cached is not None and cached[0] == etag:
+            response = HttpResponse(cached[1])
+        else:
+            response = _render_school_detail(request, school_id)
+            cache.set(cache_key, (etag, response.content), SCHOOL_PAGE_CACHE_TIMEOUT)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _render_school_detail(request, school_id):
+    """Render the school detail page from the database"""
     school = get_object_or_404(School.objects.prefetch_related('facilities'), pk=school_id)
-    reviews = Review.objects.filter(school=school).order_by('-created_at')
+    reviews, next_review_cursor = _review_page(school.pk, None, REVIEW_PAGE_SIZE)
     
-    # Calculate rating distribution efficiently in one query
-    rating_dist_data = reviews.values('rating').annotate(count=Count('id')).order_by('-rating')
-    rating_dist = {i: 0 for i in range(1, 6)}
-    total_reviews = 0
-    for item in rating_dist_data:
-        rating_dist[item['rating']] = item['count']
-        total_reviews += item['count']
+    # Rating distribution and average come from the school's review counters
+    rating_dist = school.rating_counts
+    total_reviews = sum(rating_dist.values())
     
     # Use review_count from model if available, otherwise use count from reviews
     display_review_count = school.review_count if school.review_count > 0 else total_reviews
@@ -194,23 +556,86 @@ def school_detail_view(request, school_id):
                         for i in range(5, 0, -1)]
     
     # Get average rating - use school.rating if available and no reviews in DB
-    avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or (school.rating if school.rating > 0 else 0)
+    avg_rating = school.review_average or (school.rating if school.rating > 0 else 0)
     
-    # Pre-calculate fee
-    school.default_fee = school.get_default_fee()
+    # Nearby schools come from the in-memory grid index once this process holds
+    # it (any distance search builds it); otherwise from indexed geohash queries,
+    # so rendering one detail page never loads every school's coordinates
+    nearby_schools = []
+    if school.latitude is not None and school.longitude is not None:
+        origin = (school.latitude, school.longitude)
+        nearby_fields = ('id', 'name', 'location', 'board', 'rating')
+        if school_coordinates.is_current():
+            nearest = school_coordinates.nearest(origin, NEARBY_SCHOOLS_COUNT, exclude={school.pk})
+            nearby_by_id = School.objects.only(*nearby_fields).in_bulk([pk for pk, km in nearest])
+            for pk, km in nearest:
+                if pk in nearby_by_id:
+                    nearby = nearby_by_id[pk]
+                    nearby.calculated_distance = km
+                    nearby_schools.append(nearby)
+        else:
+            nearby_schools = School.objects.exclude(pk=school.pk).only(*nearby_fields).nearest(
+                origin, NEARBY_SCHOOLS_COUNT
+            )
+        for nearby in nearby_schools:
+            nearby.calculated_distance = round(nearby.calculated_distance, 1)
     
     context = {
         'school': school,
-        'reviews': reviews[:10],  # Show first 10 reviews
+        'reviews': reviews,
+        'next_review_cursor': next_review_cursor,
         'rating_distribution': rating_dist,
         'rating_distribution_list': rating_dist_list,
         'total_reviews': total_reviews,
         'display_review_count': display_review_count,
         'average_rating': round(avg_rating, 1) if avg_rating else school.rating,
+        'nearby_schools': nearby_schools,
     }
+    # Address, facilities and contact sections only change with the school itself
+    context['address_html'], context['facilities_html'], context['contact_html'] = render_fragments([
+        ('partials/school_address.html', school),
+        ('partials/school_facilities.html', school),
+        ('partials/school_contact.html', school),
+    ])
     return render(request, 'school_detail.html', context)
 
 
+def _review_page(school_id, after, page_size):
+    """
+    One page of a school's reviews, newest first, after the keyset cursor
+    key `after` ((created_at ISO string, id) or None for the first page).
+    
+    Returns (reviews, next cursor or None). The (school, created_at, id)
+    index serves every page as a range scan, however deep.
+    """
+    reviews = Review.objects.filter(school_id=school_id)
+    if after is not None:
+        created_at = parse_datetime(str(after[0])) if len(after) == 2 else None
+        if created_at is not None and isinstance(after[1], int):
+            reviews = reviews.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=after[1])
+            )
+    page = list(reviews.order_by('-created_at', '-pk')[:page_size + 1])
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        last = page[-1]
+        next_cursor = encode_cursor('reviews', (last.created_at.isoformat(), last.pk))
+    return page, next_cursor
+
+
+def school_reviews_view(request, school_id):
+    """Next page of a school's reviews as an HTML fragment, for the detail page's lazy loading"""
+    if not School.objects.filter(pk=school_id).exists():
+        raise Http404('No School matches the given query.')
+    page_size = parse_page_size(request.GET.get('page_size'), default=REVIEW_PAGE_SIZE)
+    after = decode_cursor(request.GET.get('cursor'), 'reviews')
+    reviews, next_cursor = _review_page(school_id, after, page_size)
+    response = render(request, 'partials/review_items.html', {'reviews': reviews})
+    response['X-Next-Cursor'] = next_cursor or ''
+    return response
+
+
 def ai_picker_view(request):
     """AI Picker page"""
     # List of all countries in the world
@@ -190,6 +190,9 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Pin-code centroid gazetteer built by `python manage.py build_pincode_gazetteer`
+PINCODE_GAZETTEER_PATH = config('PINCODE_GAZETTEER_PATH', default=str(BASE_DIR / 'data' / 'pincodes.bin'))
+
 # Cache configuration
 CACHES = {
     'default': {